@@ -13,6 +13,14 @@ class Config:
     MONGO_DB_NAME = os.getenv('MONGO_DB_NAME', 'infocal')
     
     MONGO_URI = f"mongodb://{MONGO_USERNAME}:{MONGO_PASSWORD}@{MONGO_HOST}:{MONGO_PORT}/{MONGO_DB_NAME}?authSource=admin"
+    # Client settings for the shared, per-process MongoClient (app/models/db.py)
+    MONGO_MAX_POOL_SIZE = int(os.getenv('MONGO_MAX_POOL_SIZE', '50'))
+    MONGO_MIN_POOL_SIZE = int(os.getenv('MONGO_MIN_POOL_SIZE', '0'))
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000'))
+    MONGO_CONNECT_TIMEOUT_MS = int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', '5000'))
+    MONGO_SOCKET_TIMEOUT_MS = int(os.getenv('MONGO_SOCKET_TIMEOUT_MS', '0'))  # 0 = no timeout
+    MONGO_READ_PREFERENCE = os.getenv('MONGO_READ_PREFERENCE', 'primary')
+    MONGO_WRITE_CONCERN = os.getenv('MONGO_WRITE_CONCERN')  # e.g. 'majority' or '1'; unset = server default
     
     # Google OAuth Configuration
     GOOGLE_CLIENT_ID = os.getenv('GOOGLE_CLIENT_ID')
@@ -23,14 +31,89 @@ class Config:
     ENCRYPTION_KEY = os.getenv('ENCRYPTION_KEY')  # Remove .encode()
     JWT_SECRET = os.getenv('JWT_SECRET')
     JWT_EXPIRATION = int(os.getenv('JWT_EXPIRATION', '3600'))
+    # Bearer token for /api/metrics scrapers; without it the endpoint takes a user login
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')
     
     # Geosphere API Configuration
-    GEOSPHERE_API_URL = os.getenv('GEOSPHERE_API_URL')
+    GEOSPHERE_API_URL = os.getenv('GEOSPHERE_API_URL')  # Warnstatus snapshot endpoint
+    GEOSPHERE_MODE = os.getenv('GEOSPHERE_MODE', 'coords').lower()  # 'coords' or 'snapshot'
     GEOSPHERE_API_KEY = os.getenv('GEOSPHERE_API_KEY')
+    GEOSPHERE_MAX_WORKERS = int(os.getenv('GEOSPHERE_MAX_WORKERS', '8'))  # 1 = sequential
+    GEOSPHERE_POOL_MAXSIZE = int(os.getenv('GEOSPHERE_POOL_MAXSIZE', '10'))  # Connections per host
+    GEOSPHERE_CACHE_TTL = int(os.getenv('GEOSPHERE_CACHE_TTL', '3600'))  # Seconds, 0 = no expiry
+    GEOSPHERE_CACHE_MAX_ENTRIES = int(os.getenv('GEOSPHERE_CACHE_MAX_ENTRIES', '5000'))
     
     # Warning Configuration
     WARNING_CHECK_INTERVAL = int(os.getenv('WARNING_CHECK_INTERVAL', '300'))
     WARNING_RADIUS_KM = float(os.getenv('WARNING_RADIUS_KM', '50.0'))
+    # Warnings fetched for a coordinate match user locations this close to it (rounding, re-geocoding)
+    POINT_MATCH_TOLERANCE_KM = float(os.getenv('POINT_MATCH_TOLERANCE_KM', '1.0'))
+    # Warning history writes are buffered and flushed in bulk at either threshold
+    HISTORY_FLUSH_SIZE = int(os.getenv('HISTORY_FLUSH_SIZE', '500'))
+    HISTORY_FLUSH_INTERVAL = float(os.getenv('HISTORY_FLUSH_INTERVAL', '2.0'))  # Seconds
+    HISTORY_WRITE_ATTEMPTS = int(os.getenv('HISTORY_WRITE_ATTEMPTS', '5'))  # Per record rejected by Mongo, then dropped
+    # Stored warnings are expired by TTL this long after they end
+    WARNING_STORE_EXPIRY_HOURS = int(os.getenv('WARNING_STORE_EXPIRY_HOURS', '24'))
+    # Warning history older than this is archived (or expired by TTL if archival is off); minimum 14
+    WARNING_HISTORY_RETENTION_DAYS = int(os.getenv('WARNING_HISTORY_RETENTION_DAYS', '90'))
+    WARNING_HISTORY_ARCHIVE = os.getenv('WARNING_HISTORY_ARCHIVE', 'True').lower() == 'true'
+    WARNING_HISTORY_ARCHIVE_INTERVAL = int(os.getenv('WARNING_HISTORY_ARCHIVE_INTERVAL', '3600'))  # Seconds
+    WARNING_HISTORY_ARCHIVE_BATCH = int(os.getenv('WARNING_HISTORY_ARCHIVE_BATCH', '1000'))
+    # Users read from Mongo and matched per batch by the warning processor
+    USER_BATCH_SIZE = int(os.getenv('USER_BATCH_SIZE', '500'))
+    # Process every warning (not only changes) once per this many cycles
+    WARNING_FULL_SYNC_CYCLES = int(os.getenv('WARNING_FULL_SYNC_CYCLES', '12'))
+    # Grid size in degrees used to collapse nearby user locations before fetching
+    LOCATION_GRID_DEGREES = float(os.getenv('LOCATION_GRID_DEGREES', '0.01'))
+    GEOMETRY_CACHE_MAX_ENTRIES = int(os.getenv('GEOMETRY_CACHE_MAX_ENTRIES', '2000'))
+    # Seconds between full reloads of the in-memory location -> subscribers index.
+    # Changing LOCATION_GRID_DEGREES requires dropping location_subscriptions (it is backfilled).
+    LOCATION_INDEX_FULL_RELOAD = int(os.getenv('LOCATION_INDEX_FULL_RELOAD', '3600'))
+    
+    # Leases electing one warning processor and one geocoding worker across processes (seconds)
+    LEADER_LEASE_TTL = float(os.getenv('LEADER_LEASE_TTL', '30'))
+    LEADER_LEASE_RENEW_INTERVAL = float(os.getenv('LEADER_LEASE_RENEW_INTERVAL', '10'))
+
+    # Users are hash-partitioned into this many shards, spread over all worker processes.
+    # Changing it only affects cycles published afterwards.
+    WARNING_SHARDS = int(os.getenv('WARNING_SHARDS', '8'))
+    SHARD_POLL_INTERVAL = float(os.getenv('SHARD_POLL_INTERVAL', '5'))  # Seconds between checks for new cycles
+    PROCESSING_CYCLE_RETENTION_HOURS = int(os.getenv('PROCESSING_CYCLE_RETENTION_HOURS', '6'))
+
+    # Users of a batch are processed concurrently (1 = sequential); a user taking longer
+    # than the timeout is abandoned so the batch can move on, and retried on the next pass
+    USER_PROCESSING_WORKERS = int(os.getenv('USER_PROCESSING_WORKERS', '8'))
+    USER_PROCESSING_TIMEOUT = float(os.getenv('USER_PROCESSING_TIMEOUT', '60'))  # Seconds
+    USER_PROCESSING_RETRIES = int(os.getenv('USER_PROCESSING_RETRIES', '2'))  # Per user and cycle, then skipped
+    GOOGLE_API_TIMEOUT = float(os.getenv('GOOGLE_API_TIMEOUT', '20'))  # Socket timeout of Calendar requests
+    # Calendar events of one user are created with batch requests of up to this many inserts (max 50)
+    CALENDAR_BATCH_SIZE = int(os.getenv('CALENDAR_BATCH_SIZE', '50'))
+    CALENDAR_MAX_ATTEMPTS = int(os.getenv('CALENDAR_MAX_ATTEMPTS', '3'))  # Per insert, including the first
+
+    # Geocoding Cache Configuration
+    GEOCODE_CACHE_TTL = int(os.getenv('GEOCODE_CACHE_TTL', str(30 * 24 * 3600)))  # Seconds
+    GEOCODE_NEGATIVE_TTL = int(os.getenv('GEOCODE_NEGATIVE_TTL', str(24 * 3600)))  # Seconds for "not found"
+    GEOCODE_CACHE_MAX_ENTRIES = int(os.getenv('GEOCODE_CACHE_MAX_ENTRIES', '10000'))
+    GEOCODE_MIN_INTERVAL = float(os.getenv('GEOCODE_MIN_INTERVAL', '1.0'))  # Nominatim allows 1 req/s
+    GEOCODE_QUEUE_POLL_INTERVAL = float(os.getenv('GEOCODE_QUEUE_POLL_INTERVAL', '1.0'))
+    GEOCODE_MAX_ATTEMPTS = int(os.getenv('GEOCODE_MAX_ATTEMPTS', '3'))
+    # A failed job waits this long before its next attempt, doubling after every failure
+    GEOCODE_RETRY_BACKOFF = float(os.getenv('GEOCODE_RETRY_BACKOFF', '60'))  # Seconds
+    GEOCODE_RETRY_MAX_BACKOFF = float(os.getenv('GEOCODE_RETRY_MAX_BACKOFF', '1800'))  # Seconds
+    LOCATION_IMPORT_MAX_ROWS = int(os.getenv('LOCATION_IMPORT_MAX_ROWS', '1000'))
+    # CSV of places (name,postcode,state,lat,lon) used for autocomplete and offline lookups.
+    # The bundled file only covers ~90 larger towns; point this at the full Statistik Austria
+    # municipality list (~2,100 rows, same columns) to keep all municipality lookups offline
+    GAZETTEER_PATH = os.getenv(
+        'GAZETTEER_PATH',
+        os.path.join(os.path.dirname(__file__), 'data', 'gazetteer_at.csv')
+    )
+    # A gazetteer with fewer places is reported as partial coverage
+    GAZETTEER_COMPLETE_PLACES = int(os.getenv('GAZETTEER_COMPLETE_PLACES', '2000'))
+    
+    # API user cache (per process); writes from other processes show up after the TTL
+    USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', '5'))  # Seconds
+    USER_CACHE_MAX_ENTRIES = int(os.getenv('USER_CACHE_MAX_ENTRIES', '1000'))
     
     # Logging Configuration
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
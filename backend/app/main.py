@@ -1,9 +1,12 @@
-from flask import Flask, request, jsonify, redirect
+from flask import Flask, request, jsonify, redirect, g
 from flask_cors import CORS
 from datetime import datetime, timedelta
 import jwt
 import logging
 from functools import wraps
+import csv
+import hmac
+import io
 from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import build
 import os
@@ -13,10 +16,13 @@ from .services.calendar_service import GoogleCalendarService
 from .services.geosphere_service import GeosphereService
 from .services.warning_service import WarningService
 from .services.oauth_service import GoogleOAuthService
+from .services.geocoding_service import GeocodingService, ImportConflictError
 from .models.user import User
+from .models.warning import Warning
+from .models.processing_cycle import ProcessingCycle
 from .utils.encryption import encrypt_token, decrypt_token
 from .utils.logging_setup import setup_logging
-from .utils.geo import geocode_location
+from .utils.geo import LocationNotFoundError
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -30,6 +36,7 @@ logger = logging.getLogger(__name__)
 warning_service = WarningService()
 geosphere_service = GeosphereService()
 oauth_service = GoogleOAuthService()
+geocoding_service = GeocodingService()
 
 def require_auth(f):
     @wraps(f)
@@ -41,6 +48,7 @@ def require_auth(f):
         try:
             token = auth_header.split(' ')[1]
             payload = jwt.decode(token, Config.JWT_SECRET, algorithms=['HS256'])
+            g.user_email = payload['email']
             return f(payload['email'], *args, **kwargs)
         except jwt.ExpiredSignatureError:
             return jsonify({'error': 'Token has expired'}), 401
@@ -52,6 +60,32 @@ def require_auth(f):
 
     return decorated
 
+def require_metrics_auth(f):
+    """Accept the METRICS_TOKEN bearer token if one is configured, else a user login"""
+    user_auth = require_auth(lambda email, *args, **kwargs: f(*args, **kwargs))
+
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if not Config.METRICS_TOKEN:
+            return user_auth(*args, **kwargs)
+
+        scheme, _, token = (request.headers.get('Authorization') or '').partition(' ')
+        if scheme.lower() != 'bearer' or not hmac.compare_digest(token.encode(), Config.METRICS_TOKEN.encode()):
+            return jsonify({'error': 'Invalid metrics token'}), 401
+        return f(*args, **kwargs)
+
+    return decorated
+
+def current_user(create=True):
+    """
+    Return the authenticated user, loaded at most once per request (and
+    usually served from the user cache). With create, a missing user is
+    created by the same single upsert.
+    """
+    if getattr(g, 'user', None) is None:
+        g.user = User.load(g.user_email, create=create)
+    return g.user
+
 @app.route('/api/health')
 def health_check():
     """Health check endpoint"""
@@ -60,6 +94,20 @@ def health_check():
         'timestamp': datetime.utcnow().isoformat()
     })
 
+@app.route('/api/metrics')
+@require_metrics_auth
+def metrics():
+    """Processor metrics for scraping"""
+    return jsonify({
+        'geosphere': warning_service.geosphere_service.get_stats(),
+        'cycle': warning_service.last_cycle_stats,
+        'history': warning_service.history_writer.get_stats(),
+        'geocoding': geocoding_service.get_stats(),
+        'leases': [warning_service.lease.get_stats(), geocoding_service.worker_lease.get_stats()],
+        'shards': warning_service.get_shard_stats(),
+        'timestamp': datetime.utcnow().isoformat()
+    })
+
 @app.route('/api/auth/google', methods=['POST'])
 def google_auth():
     """Initialize Google OAuth flow"""
@@ -141,7 +189,7 @@ def oauth2callback():
 def auth_status(email):
     """Check authentication status"""
     try:
-        user = User.find_by_email(email)
+        user = current_user(create=False)
         if not user:
             return jsonify({'authenticated': False}), 401
         return jsonify({
@@ -157,9 +205,7 @@ def auth_status(email):
 def get_locations(email):
     """Get user's locations"""
     try:
-        user = User.find_by_email(email)
-        if not user:
-            user = User.create_or_update(email=email)
+        user = current_user()
         return jsonify({'locations': user.locations})
     except Exception as e:
         logger.error(f"Error getting locations: {str(e)}")
@@ -175,17 +221,17 @@ def add_location(email):
             return jsonify({'error': 'Location name required'}), 400
 
         # Get or create user
-        user = User.find_by_email(email)
-        if not user:
-            user = User.create_or_update(email=email)
+        user = current_user()
 
         try:
-            location_data = geocode_location(location_name)
-            if not location_data:
-                return jsonify({'error': 'Location not found'}), 404
-        except Exception as e:
-            logger.error(f"Geocoding error for {location_name}: {str(e)}")
-            return jsonify({'error': 'Failed to geocode location'}), 400
+            location_data = geocoding_service.lookup_cached(location_name)
+        except LocationNotFoundError:
+            return jsonify({'error': 'Location not found'}), 404
+
+        if location_data is None:
+            # Not cached: geocode in the background and return a pending record
+            location = geocoding_service.enqueue(user, location_name)
+            return jsonify({'location': location}), 202
 
         location = user.add_location(location_data)
         return jsonify({'location': location})
@@ -193,6 +239,90 @@ def add_location(email):
         logger.error(f"Error adding location: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+def _parse_location_rows():
+    """
+    Read location import rows from the request: an uploaded CSV file, a
+    text/csv body, or JSON (a list, or {'locations': [...]}) of names or
+    objects. CSV files need a 'name' column, or have the name in the first
+    column; 'lat', 'lon' and 'address' columns are optional.
+    """
+    if 'file' in request.files:
+        return _parse_location_csv(request.files['file'].read().decode('utf-8-sig'))
+    if request.mimetype == 'text/csv':
+        return _parse_location_csv(request.get_data(as_text=True))
+
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get('locations')
+    if not isinstance(data, list):
+        raise ValueError('Expected a CSV file or a JSON list of locations')
+    return [item if isinstance(item, dict) else {'name': item} for item in data]
+
+def _parse_location_csv(text):
+    lines = text.splitlines()
+    if not lines:
+        return []
+
+    header = [column.strip().lower() for column in next(csv.reader(lines[:1]))]
+    if 'name' not in header:
+        return [{'name': row[0]} for row in csv.reader(lines) if row]
+
+    rows = []
+    for row in csv.DictReader(io.StringIO(text)):
+        row = {(key or '').strip().lower(): value for key, value in row.items()}
+        if any(row.values()):
+            rows.append(row)
+    return rows
+
+@app.route('/api/locations/import', methods=['POST'])
+@require_auth
+def import_locations(email):
+    """Add many locations at once from a CSV or JSON list"""
+    try:
+        try:
+            rows = _parse_location_rows()
+        except (ValueError, UnicodeDecodeError, csv.Error) as e:
+            return jsonify({'error': str(e)}), 400
+
+        if not rows:
+            return jsonify({'error': 'No locations to import'}), 400
+        if len(rows) > Config.LOCATION_IMPORT_MAX_ROWS:
+            return jsonify({'error': f'At most {Config.LOCATION_IMPORT_MAX_ROWS} locations per import'}), 413
+
+        user = current_user()
+
+        try:
+            results = geocoding_service.import_locations(user, rows)
+        except ImportConflictError as e:
+            logger.warning(str(e))
+            return jsonify({'error': 'Locations were changed concurrently, please retry the import'}), 409
+        summary = {}
+        for result in results:
+            summary[result['status']] = summary.get(result['status'], 0) + 1
+
+        # Queued names are still pending: the worker geocodes and adds their coordinates one by one
+        pending = summary.get('queued', 0)
+        status_code = 202 if pending else 200
+        return jsonify({'results': results, 'summary': summary, 'pending': pending}), status_code
+    except Exception as e:
+        logger.error(f"Error importing locations: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/locations/suggest', methods=['GET'])
+@require_auth
+def suggest_locations(email):
+    """Suggest places from the offline gazetteer for a name or postcode prefix"""
+    try:
+        query = request.args.get('q', '').strip()
+        limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+        if not query:
+            return jsonify({'suggestions': []})
+
+        return jsonify({'suggestions': geocoding_service.suggest(query, limit)})
+    except Exception as e:
+        logger.error(f"Error suggesting locations: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/locations', methods=['DELETE'])
 @require_auth
 def remove_location(email):
@@ -202,7 +332,7 @@ def remove_location(email):
         if not location:
             return jsonify({'error': 'Location required'}), 400
 
-        user = User.find_by_email(email)
+        user = current_user(create=False)
         if not user:
             return jsonify({'error': 'User not found'}), 404
 
@@ -217,9 +347,7 @@ def remove_location(email):
 def get_preferences(email):
     """Get user's warning preferences"""
     try:
-        user = User.find_by_email(email)
-        if not user:
-            user = User.create_or_update(email=email)
+        user = current_user()
         return jsonify({'preferences': user.warning_preferences})
     except Exception as e:
         logger.error(f"Error getting preferences: {str(e)}")
@@ -234,15 +362,15 @@ def update_preferences(email):
         if not preferences:
             return jsonify({'error': 'Preferences required'}), 400
 
-        user = User.find_by_email(email)
-        if not user:
-            user = User.create_or_update(email=email)
+        user = current_user()
             
         user.update_preferences(preferences)
         return jsonify({
             'status': 'success',
             'preferences': user.warning_preferences
         })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Error updating preferences: {str(e)}")
         return jsonify({'error': str(e)}), 500
@@ -252,12 +380,12 @@ def update_preferences(email):
 def get_warning_history(email):
     """Get warning history for user"""
     try:
-        limit = request.args.get('limit', default=50, type=int)
-        user = User.find_by_email(email)
-        if not user:
-            user = User.create_or_update(email=email)
-        history = warning_service.get_user_warning_history(email, limit)
-        return jsonify({'history': history})
+        limit = min(max(request.args.get('limit', default=50, type=int), 1), 200)
+        after = request.args.get('after')
+        history, next_cursor = warning_service.get_user_warning_history(email, limit, after)
+        return jsonify({'history': history, 'next': next_cursor})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Error getting warning history: {str(e)}")
         return jsonify({'error': str(e)}), 500
@@ -267,9 +395,7 @@ def get_warning_history(email):
 def get_active_warnings(email):
     """Get active warnings for user"""
     try:
-        user = User.find_by_email(email)
-        if not user:
-            user = User.create_or_update(email=email)
+        user = current_user()
             
         warnings = warning_service.get_active_warnings(user)
         return jsonify({'warnings': warnings})
@@ -278,7 +404,10 @@ def get_active_warnings(email):
         return jsonify({'error': str(e)}), 500
 
 if __name__ == '__main__':
-    # Start the warning processor
+    Warning.ensure_indexes()
+    ProcessingCycle.ensure_indexes()
+    # Start the warning processor and the geocoding worker
     warning_service.start_warning_processor()
+    geocoding_service.start_worker()
     # Run the application
     app.run(host='0.0.0.0', port=8080)
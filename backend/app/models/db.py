@@ -0,0 +1,70 @@
+import logging
+import os
+from threading import Lock
+from pymongo import MongoClient
+from ..config import Config
+
+logger = logging.getLogger(__name__)
+
+# One client (and so one connection pool) per process, created on first use
+_client = None
+_client_pid = None
+_client_lock = Lock()
+
+def _client_options():
+    options = {
+        'maxPoolSize': Config.MONGO_MAX_POOL_SIZE,
+        'minPoolSize': Config.MONGO_MIN_POOL_SIZE,
+        'serverSelectionTimeoutMS': Config.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        'connectTimeoutMS': Config.MONGO_CONNECT_TIMEOUT_MS,
+        'socketTimeoutMS': Config.MONGO_SOCKET_TIMEOUT_MS or None,
+        'readPreference': Config.MONGO_READ_PREFERENCE
+    }
+    if Config.MONGO_WRITE_CONCERN:
+        write_concern = Config.MONGO_WRITE_CONCERN
+        options['w'] = int(write_concern) if write_concern.isdigit() else write_concern
+    return options
+
+def get_client() -> MongoClient:
+    """
+    Return the process-wide MongoClient, creating it on first use.
+
+    MongoClient is not fork-safe: a client inherited from the parent (e.g.
+    the gunicorn master with --preload) is discarded and a new one created
+    in the child.
+    """
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _client_lock:
+            if _client is None or _client_pid != pid:
+                _client = MongoClient(Config.MONGO_URI, **_client_options())
+                _client_pid = pid
+                logger.info(f"Created MongoDB client for process {pid}")
+    return _client
+
+def get_db():
+    """Return the application database on the shared client"""
+    return get_client()[Config.MONGO_DB_NAME]
+
+def _reset_after_fork():
+    # The parent's client and lock must not be used in the child
+    global _client, _client_pid, _client_lock
+    _client = None
+    _client_pid = None
+    _client_lock = Lock()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+class LazyCollection:
+    """
+    Model class attribute that resolves to a collection of the shared
+    database when accessed, so defining a model never connects.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        return get_db()[self.name]
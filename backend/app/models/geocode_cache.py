@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta
+import logging
+from .db import LazyCollection
+
+logger = logging.getLogger(__name__)
+
+class GeocodeCache:
+    """Shared geocoding results, including negative ("not found") entries"""
+    collection = LazyCollection('geocode_cache')
+    _indexes_ready = False
+
+    @classmethod
+    def ensure_indexes(cls):
+        """Create the lookup and TTL indexes once per process"""
+        if cls._indexes_ready:
+            return
+        cls.collection.create_index('key', unique=True)
+        cls.collection.create_index('expires_at', expireAfterSeconds=0)
+        cls._indexes_ready = True
+
+    @classmethod
+    def get(cls, key):
+        """Return the cached entry for a normalised query key, or None"""
+        cls.ensure_indexes()
+        return cls.collection.find_one(
+            {'key': key, 'expires_at': {'$gt': datetime.utcnow()}},
+            {'_id': 0}
+        )
+
+    @classmethod
+    def get_many(cls, keys):
+        """Return cached entries for several query keys in one query, keyed by key"""
+        if not keys:
+            return {}
+        cls.ensure_indexes()
+        cursor = cls.collection.find(
+            {'key': {'$in': list(keys)}, 'expires_at': {'$gt': datetime.utcnow()}},
+            {'_id': 0}
+        )
+        return {entry['key']: entry for entry in cursor}
+
+    @classmethod
+    def put(cls, key, location, ttl):
+        """Cache a geocoding result; location None records a negative result"""
+        cls.ensure_indexes()
+        now = datetime.utcnow()
+        cls.collection.update_one(
+            {'key': key},
+            {'$set': {
+                'key': key,
+                'found': location is not None,
+                'location': location,
+                'created_at': now,
+                'expires_at': now + timedelta(seconds=ttl)
+            }},
+            upsert=True
+        )
@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta
+import logging
+from pymongo import ReturnDocument
+from .db import LazyCollection
+
+logger = logging.getLogger(__name__)
+
+class GeocodeJob:
+    """
+    Queued location names waiting to be geocoded in the background.
+
+    A job is claimed once its next_attempt_at has passed; failed jobs are
+    put back with a later next_attempt_at, so retries back off instead of
+    spending every attempt during an upstream outage.
+    """
+    collection = LazyCollection('geocode_jobs')
+    _indexes_ready = False
+
+    # A job stuck in 'processing' this long is assumed to belong to a dead worker
+    STALE_AFTER = timedelta(minutes=5)
+
+    @classmethod
+    def ensure_indexes(cls):
+        if cls._indexes_ready:
+            return
+        cls.collection.create_index([('status', 1), ('created_at', 1)])
+        cls._indexes_ready = True
+
+    @classmethod
+    def enqueue(cls, user_email, name):
+        """Queue a location name for geocoding"""
+        cls.ensure_indexes()
+        now = datetime.utcnow()
+        result = cls.collection.insert_one({
+            'user_email': user_email,
+            'name': name,
+            'status': 'queued',
+            'attempts': 0,
+            'next_attempt_at': now,
+            'created_at': now,
+            'updated_at': now
+        })
+        return result.inserted_id
+
+    @classmethod
+    def enqueue_many(cls, user_email, names):
+        """Queue several location names for geocoding in one insert"""
+        if not names:
+            return []
+        cls.ensure_indexes()
+        now = datetime.utcnow()
+        result = cls.collection.insert_many([
+            {
+                'user_email': user_email,
+                'name': name,
+                'status': 'queued',
+                'attempts': 0,
+                'next_attempt_at': now,
+                'created_at': now,
+                'updated_at': now
+            }
+            for name in names
+        ])
+        return result.inserted_ids
+
+    @classmethod
+    def claim_next(cls):
+        """Atomically claim the oldest queued job that is due (or a stale one)"""
+        cls.ensure_indexes()
+        now = datetime.utcnow()
+        return cls.collection.find_one_and_update(
+            {'$or': [
+                # Jobs queued before next_attempt_at existed have no field and are due
+                {'status': 'queued', 'next_attempt_at': {'$not': {'$gt': now}}},
+                {'status': 'processing', 'updated_at': {'$lt': now - cls.STALE_AFTER}}
+            ]},
+            {'$set': {'status': 'processing', 'updated_at': now}, '$inc': {'attempts': 1}},
+            sort=[('created_at', 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    @classmethod
+    def complete(cls, job_id):
+        cls.collection.delete_one({'_id': job_id})
+
+    @classmethod
+    def retry(cls, job_id, error, delay):
+        """Queue a failed job again, to be claimed no earlier than delay seconds from now"""
+        now = datetime.utcnow()
+        cls.collection.update_one(
+            {'_id': job_id},
+            {'$set': {
+                'status': 'queued',
+                'error': error,
+                'next_attempt_at': now + timedelta(seconds=delay),
+                'updated_at': now
+            }}
+        )
+
+    @classmethod
+    def fail(cls, job_id, error):
+        cls.collection.update_one(
+            {'_id': job_id},
+            {'$set': {'status': 'failed', 'error': error, 'updated_at': datetime.utcnow()}}
+        )
@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta
+import logging
+import re
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from .db import LazyCollection
+
+logger = logging.getLogger(__name__)
+
+class Lease:
+    """
+    Named leases for singleton background work.
+
+    One document per lease: {_id: name, holder, token, expires_at, renewed_at}.
+    The holder renews before expires_at; once it has passed, any process may
+    take the lease over. Every takeover increments token, so a holder that
+    stalled past its expiry can tell from its stale token that it was fenced
+    off.
+    """
+    collection = LazyCollection('leases')
+
+    @classmethod
+    def acquire(cls, name, holder, ttl, token=None):
+        """
+        Renew the lease if holder still owns it with the given token,
+        otherwise take it over if it is free or expired.
+
+        Returns:
+            int: The fencing token now held, or None if another holder owns the lease
+        """
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=ttl)
+
+        if token is not None:
+            renewed = cls.collection.find_one_and_update(
+                {'_id': name, 'holder': holder, 'token': token, 'expires_at': {'$gt': now}},
+                {'$set': {'expires_at': expires_at, 'renewed_at': now}},
+                return_document=ReturnDocument.AFTER
+            )
+            if renewed is not None:
+                return renewed['token']
+
+        try:
+            # A live lease fails the filter, so the upsert collides on _id
+            acquired = cls.collection.find_one_and_update(
+                {'_id': name, 'expires_at': {'$lte': now}},
+                {
+                    '$set': {'holder': holder, 'expires_at': expires_at, 'renewed_at': now, 'acquired_at': now},
+                    '$inc': {'token': 1}
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            return None
+        logger.info(f"Lease {name} acquired by {holder} with token {acquired['token']}")
+        return acquired['token']
+
+    @classmethod
+    def release(cls, name, holder, token):
+        """Expire the lease now so another process can take over without waiting"""
+        result = cls.collection.update_one(
+            {'_id': name, 'holder': holder, 'token': token},
+            {'$set': {'expires_at': datetime.utcnow()}}
+        )
+        return result.modified_count == 1
+
+    @classmethod
+    def is_current(cls, name, token):
+        """Check that token is still the lease's latest fencing token and has not expired"""
+        lease = cls.collection.find_one({'_id': name}, {'token': 1, 'expires_at': 1})
+        return lease is not None and lease.get('token') == token and lease['expires_at'] > datetime.utcnow()
+
+    @classmethod
+    def find_live(cls, prefix):
+        """Return the unexpired leases whose name starts with prefix"""
+        return list(cls.collection.find(
+            {'_id': {'$regex': f"^{re.escape(prefix)}"}, 'expires_at': {'$gt': datetime.utcnow()}},
+            {'holder': 1, 'token': 1}
+        ))
+
+    @classmethod
+    def get(cls, name):
+        return cls.collection.find_one({'_id': name})
@@ -0,0 +1,111 @@
+from datetime import datetime
+import logging
+from pymongo import UpdateOne
+from ..config import Config
+from .db import LazyCollection
+from ..utils.geo import snap_to_grid
+
+logger = logging.getLogger(__name__)
+
+class LocationSubscription:
+    """
+    Inverted index from location grid cell to the users subscribed to it.
+
+    One document per LOCATION_GRID_DEGREES cell:
+    {_id: "lat,lon", lat, lon, subscribers: [{email, name, lat, lon}], updated_at}.
+    Cells are kept (with an empty list) when their last subscriber leaves so
+    that incremental readers see the change through updated_at.
+    """
+    collection = LazyCollection('location_subscriptions')
+    _indexes_ready = False
+
+    @classmethod
+    def ensure_indexes(cls):
+        if cls._indexes_ready:
+            return
+        cls.collection.create_index('updated_at')
+        cls.collection.create_index([('subscribers.email', 1), ('subscribers.name', 1)])
+        cls._indexes_ready = True
+
+    @staticmethod
+    def cell_id(lat, lon):
+        lat, lon = snap_to_grid(lat, lon, Config.LOCATION_GRID_DEGREES)
+        return f"{lat},{lon}"
+
+    @classmethod
+    def subscribe(cls, email, location):
+        """Subscribe a user's geocoded location; locations without coordinates are ignored"""
+        cls.subscribe_many(email, [location])
+
+    @classmethod
+    def subscribe_many(cls, email, locations):
+        """Subscribe several locations of one user in a single bulk write"""
+        try:
+            operations = [
+                cls._subscribe_operation(email, location)
+                for location in locations
+                if location.get('lat') is not None and location.get('lon') is not None
+            ]
+            if not operations:
+                return
+            cls.ensure_indexes()
+            cls.collection.bulk_write(operations, ordered=False)
+        except Exception as e:
+            logger.error(f"Error subscribing locations for user {email}: {str(e)}")
+            raise
+
+    @classmethod
+    def unsubscribe(cls, email, name):
+        """Remove a user's location (by name) from every cell it is subscribed to"""
+        try:
+            cls.ensure_indexes()
+            cls.collection.update_many(
+                {'subscribers': {'$elemMatch': {'email': email, 'name': name}}},
+                {
+                    '$pull': {'subscribers': {'email': email, 'name': name}},
+                    '$set': {'updated_at': datetime.utcnow()}
+                }
+            )
+        except Exception as e:
+            logger.error(f"Error unsubscribing location {name} for user {email}: {str(e)}")
+            raise
+
+    @classmethod
+    def is_empty(cls):
+        return cls.collection.estimated_document_count() == 0
+
+    @classmethod
+    def find_changed(cls, since=None):
+        """Return cells changed since the given time, or all cells"""
+        cls.ensure_indexes()
+        query = {'updated_at': {'$gte': since}} if since else {}
+        return cls.collection.find(query)
+
+    @classmethod
+    def backfill(cls, users):
+        """Subscribe the locations of existing users (objects with email and locations)"""
+        count = 0
+        for user in users:
+            cls.subscribe_many(user.email, user.locations)
+            count += 1
+        logger.info(f"Backfilled location subscriptions for {count} users")
+
+    @classmethod
+    def _subscribe_operation(cls, email, location):
+        lat = float(location['lat'])
+        lon = float(location['lon'])
+        cell_lat, cell_lon = snap_to_grid(lat, lon, Config.LOCATION_GRID_DEGREES)
+        return UpdateOne(
+            {'_id': cls.cell_id(lat, lon)},
+            {
+                '$setOnInsert': {'lat': cell_lat, 'lon': cell_lon},
+                '$addToSet': {'subscribers': {
+                    'email': email,
+                    'name': location.get('name'),
+                    'lat': lat,
+                    'lon': lon
+                }},
+                '$set': {'updated_at': datetime.utcnow()}
+            },
+            upsert=True
+        )
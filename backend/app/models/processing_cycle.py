@@ -0,0 +1,107 @@
+from datetime import datetime, timedelta
+import logging
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError
+from ..config import Config
+from .db import LazyCollection
+
+logger = logging.getLogger(__name__)
+
+class ProcessingCycle:
+    """
+    Warning processing cycles published by the leader for the shard workers.
+
+    A cycle lists the warnings to process: {_id, warning_ids, full_sync,
+    shards, created_at}, plus emails if it is limited to those users. Each shard worker records its progress through a
+    cycle in a checkpoint, {_id: "cycle:shard", cycle_id, shard, last_email,
+    done, token, updated_at}, after every batch, so a shard taken over from
+    a crashed worker resumes after the last checkpointed user instead of
+    starting over. Cycles and checkpoints expire after
+    PROCESSING_CYCLE_RETENTION_HOURS.
+    """
+    collection = LazyCollection('processing_cycles')
+    checkpoint_collection = LazyCollection('shard_checkpoints')
+
+    @classmethod
+    def ensure_indexes(cls):
+        retention = Config.PROCESSING_CYCLE_RETENTION_HOURS * 3600
+        cls.collection.create_index('created_at', expireAfterSeconds=retention)
+        cls.checkpoint_collection.create_index([('shard', ASCENDING), ('cycle_id', ASCENDING)])
+        cls.checkpoint_collection.create_index('updated_at', expireAfterSeconds=retention)
+
+    @classmethod
+    def publish(cls, warning_ids, full_sync, shards, emails=None):
+        """Publish a cycle, for all users reached or only the given emails, and return its id"""
+        cycle = {
+            'warning_ids': list(warning_ids),
+            'full_sync': full_sync,
+            'shards': shards,
+            'created_at': datetime.utcnow()
+        }
+        if emails is not None:
+            cycle['emails'] = sorted(emails)
+        result = cls.collection.insert_one(cycle)
+        return result.inserted_id
+
+    @classmethod
+    def find_pending(cls, shard, shards):
+        """
+        Return the recent cycles the shard has not completed, oldest first.
+
+        Cycles before the newest pending full sync are covered by it; they
+        are returned only as superseded ids so the caller can close them.
+
+        Returns:
+            tuple: (cycles to process, ids of superseded cycles)
+        """
+        since = datetime.utcnow() - timedelta(hours=Config.PROCESSING_CYCLE_RETENTION_HOURS)
+        cycles = list(cls.collection.find(
+            {'created_at': {'$gt': since}, 'shards': shards},
+            {'warning_ids': 1, 'full_sync': 1, 'emails': 1, 'created_at': 1}
+        ).sort('created_at', ASCENDING))
+        if not cycles:
+            return [], []
+
+        done = {
+            checkpoint['cycle_id']
+            for checkpoint in cls.checkpoint_collection.find(
+                {'shard': shard, 'cycle_id': {'$in': [cycle['_id'] for cycle in cycles]}, 'done': True},
+                {'cycle_id': 1}
+            )
+        }
+        pending = [cycle for cycle in cycles if cycle['_id'] not in done]
+
+        last_full_sync = max((index for index, cycle in enumerate(pending) if cycle['full_sync']), default=0)
+        return pending[last_full_sync:], [cycle['_id'] for cycle in pending[:last_full_sync]]
+
+    @classmethod
+    def get_checkpoint(cls, cycle_id, shard):
+        return cls.checkpoint_collection.find_one({'_id': f"{cycle_id}:{shard}"})
+
+    @classmethod
+    def advance(cls, cycle_id, shard, token, last_email=None, done=False):
+        """
+        Record a shard's progress through a cycle.
+
+        The write is fenced on the shard lease token: it fails once a worker
+        with a newer token has written the checkpoint, so a new owner calls
+        this before doing any work to shut out the previous one. Without
+        last_email the stored position is kept.
+
+        Returns:
+            bool: False if a newer shard owner has taken over
+        """
+        update = {'cycle_id': cycle_id, 'shard': shard, 'token': token, 'done': done, 'updated_at': datetime.utcnow()}
+        if last_email is not None:
+            update['last_email'] = last_email
+        try:
+            # A checkpoint written with a newer token fails the filter, so the upsert collides on _id
+            cls.checkpoint_collection.update_one(
+                {'_id': f"{cycle_id}:{shard}", 'token': {'$lte': token}},
+                {'$set': update},
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            logger.warning(f"Checkpoint for shard {shard} of cycle {cycle_id} was taken over")
+            return False
@@ -1,30 +1,56 @@
+from collections import namedtuple
+import copy
 from datetime import datetime
 import logging
-from pymongo import MongoClient
 from bson import ObjectId
+from pymongo import ReturnDocument
 from ..config import Config
+from ..utils.lru import LRUCache
+from .db import LazyCollection
+from .location_subscription import LocationSubscription
 
 logger = logging.getLogger(__name__)
 
-client = MongoClient(Config.MONGO_URI)
-db = client[Config.MONGO_DB_NAME]
+# Lightweight, read-only view of a user for the warning processor
+ActiveUser = namedtuple('ActiveUser', ['email', 'locations', 'warning_preferences'])
+
+# Per-process cache of user documents for API reads. Writes through this
+# model invalidate their entry; writes made by other processes become
+# visible once USER_CACHE_TTL expires.
+_user_cache = LRUCache(max_entries=Config.USER_CACHE_MAX_ENTRIES, ttl=Config.USER_CACHE_TTL)
 
 class User:
-    collection = db.users
+    collection = LazyCollection('users')
+
+    # Users worth processing: at least one location and a Google access token
+    ACTIVE_FILTER = {
+        'locations.0': {'$exists': True},
+        'google_tokens.access_token': {'$exists': True, '$nin': [None, '']}
+    }
+    ACTIVE_PROJECTION = {
+        '_id': 0,
+        'email': 1,
+        'locations.name': 1,
+        'locations.lat': 1,
+        'locations.lon': 1,
+        'warning_preferences': 1
+    }
+
+    DEFAULT_WARNING_PREFERENCES = {
+        'rain': True,
+        'snow': True,
+        'wind': True,
+        'storm': True,
+        'heat': True,
+        'frost': True
+    }
     
     def __init__(self, email, google_tokens=None, locations=None, warning_preferences=None, _id=None, **kwargs):
         self._id = _id
         self.email = email
         self.google_tokens = google_tokens or {}
         self.locations = locations or []
-        self.warning_preferences = warning_preferences or {
-            'rain': True,
-            'snow': True,
-            'wind': True,
-            'storm': True,
-            'heat': True,
-            'frost': True
-        }
+        self.warning_preferences = warning_preferences or dict(self.DEFAULT_WARNING_PREFERENCES)
         # Allow for any additional fields from MongoDB
         for key, value in kwargs.items():
             setattr(self, key, value)
@@ -34,43 +60,131 @@ class User:
         if not hasattr(self, 'updated_at'):
             self.updated_at = datetime.utcnow()
 
+    @classmethod
+    def from_document(cls, data):
+        # Convert ObjectId to string for JSON serialization
+        if '_id' in data:
+            data['_id'] = str(data['_id'])
+        return cls(**data)
+
     @classmethod
     def find_by_email(cls, email):
         try:
             data = cls.collection.find_one({'email': email})
             if data:
-                # Convert ObjectId to string for JSON serialization
-                if '_id' in data:
-                    data['_id'] = str(data['_id'])
-                return cls(**data)
+                return cls.from_document(data)
             return None
         except Exception as e:
             logger.error(f"Error finding user by email {email}: {str(e)}")
             raise
 
+    @classmethod
+    def load(cls, email, create=True):
+        """
+        Return the user through the short-lived user cache.
+
+        A cache miss costs one round trip; with create, a missing user is
+        inserted with defaults by the same upsert. Each call returns its own
+        copy, so callers may modify it freely.
+        """
+        data = _user_cache.get(email)
+        if data is None:
+            try:
+                if create:
+                    data = cls._get_or_create_document(email)
+                else:
+                    data = cls.collection.find_one({'email': email})
+            except Exception as e:
+                logger.error(f"Error loading user {email}: {str(e)}")
+                raise
+            if data is None:
+                return None
+            _user_cache.set(email, data)
+        return cls.from_document(copy.deepcopy(data))
+
+    @classmethod
+    def invalidate_cache(cls, email):
+        _user_cache.invalidate(email)
+
     @classmethod
     def create_or_update(cls, email, **kwargs):
-        """Create or update a user"""
+        """Create or update a user in a single upsert; fields given as None are left unchanged"""
         try:
-            user = cls.find_by_email(email)
-            if not user:
-                logger.info(f"Creating new user with email: {email}")
-                user = cls(email=email)
-            else:
-                logger.info(f"Updating existing user: {email}")
-
-            # Update user with any provided kwargs
-            for key, value in kwargs.items():
-                if value is not None:  # Only update if value is not None
-                    setattr(user, key, value)
-                    logger.info(f"Updated {key} for user {email}")
+            now = datetime.utcnow()
+            updates = {key: value for key, value in kwargs.items() if value is not None}
+            updates['updated_at'] = now
+            defaults = {
+                key: value for key, value in cls._new_user_fields(now).items()
+                if key not in updates
+            }
 
-            user.save()
-            return user
+            data = cls.collection.find_one_and_update(
+                {'email': email},
+                {'$set': updates, '$setOnInsert': defaults},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            cls.invalidate_cache(email)
+            logger.info(f"Created or updated user {email}: {', '.join(sorted(updates))}")
+            return cls.from_document(data)
         except Exception as e:
             logger.error(f"Error creating/updating user {email}: {str(e)}", exc_info=True)
             raise
 
+    @classmethod
+    def get_or_create(cls, email):
+        """Return the user, creating it with defaults if needed, in a single round trip"""
+        try:
+            return cls.from_document(cls._get_or_create_document(email))
+        except Exception as e:
+            logger.error(f"Error getting or creating user {email}: {str(e)}")
+            raise
+
+    @classmethod
+    def _get_or_create_document(cls, email):
+        now = datetime.utcnow()
+        return cls.collection.find_one_and_update(
+            {'email': email},
+            {'$setOnInsert': dict(cls._new_user_fields(now), updated_at=now)},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+
+    @classmethod
+    def _new_user_fields(cls, now):
+        return {
+            'google_tokens': {},
+            'locations': [],
+            'warning_preferences': dict(cls.DEFAULT_WARNING_PREFERENCES),
+            'created_at': now
+        }
+
+    def _update(self, query, update, fields):
+        """Apply an atomic update to this user and refresh the given fields from the result"""
+        update.setdefault('$set', {})['updated_at'] = datetime.utcnow()
+        data = self.collection.find_one_and_update(
+            dict(query, email=self.email),
+            update,
+            projection={field: 1 for field in fields + ['updated_at']},
+            return_document=ReturnDocument.AFTER
+        )
+        self.invalidate_cache(self.email)
+        if data is not None:
+            for field in fields + ['updated_at']:
+                if field in data:
+                    setattr(self, field, data[field])
+        return data
+
+    @staticmethod
+    def _dotted_fields(prefix, values):
+        """Build a dotted $set for a sub-document, rejecting keys that would address other fields"""
+        fields = {}
+        for key, value in values.items():
+            if not isinstance(key, str) or not key or '.' in key or key.startswith('$'):
+                raise ValueError(f"Invalid {prefix} key: {key!r}")
+            fields[f"{prefix}.{key}"] = value
+        return fields
+
     def save(self):
         try:
             # Prepare data for MongoDB
@@ -96,6 +210,7 @@ class User:
                 result = self.collection.insert_one(data)
                 self._id = str(result.inserted_id)
             
+            self.invalidate_cache(self.email)
             logger.info(f"Successfully saved user {self.email}")
             return self
         except Exception as e:
@@ -104,9 +219,7 @@ class User:
 
     def update_tokens(self, tokens):
         try:
-            self.google_tokens.update(tokens)
-            self.updated_at = datetime.utcnow()
-            self.save()
+            self._update({}, {'$set': self._dotted_fields('google_tokens', tokens)}, ['google_tokens'])
             logger.info(f"Updated tokens for user {self.email}")
         except Exception as e:
             logger.error(f"Error updating tokens for user {self.email}: {str(e)}")
@@ -114,11 +227,14 @@ class User:
     
     def add_location(self, location):
         try:
-            # Check if location with same name already exists
-            existing_locations = [loc.get('name') for loc in self.locations]
-            if location.get('name') not in existing_locations:
-                self.locations.append(location)
-                self.save()
+            # Only push if no location with the same name exists yet
+            added = self._update(
+                {'locations.name': {'$ne': location.get('name')}},
+                {'$push': {'locations': location}},
+                ['locations']
+            )
+            if added is not None:
+                LocationSubscription.subscribe(self.email, location)
                 logger.info(f"Added location {location.get('name')} for user {self.email}")
             return location
         except Exception as e:
@@ -127,33 +243,124 @@ class User:
     
     def remove_location(self, location):
         try:
-            self.locations = [loc for loc in self.locations if loc.get('name') != location.get('name')]
-            self.save()
+            self._update({}, {'$pull': {'locations': {'name': location.get('name')}}}, ['locations'])
+            LocationSubscription.unsubscribe(self.email, location.get('name'))
             logger.info(f"Removed location {location.get('name')} for user {self.email}")
         except Exception as e:
             logger.error(f"Error removing location for user {self.email}: {str(e)}")
             raise
     
+    @classmethod
+    def add_locations(cls, email, locations):
+        """
+        Append several locations in a single atomic update.
+
+        The update only applies if the user has none of the names yet, so a
+        concurrent add cannot create duplicates; returns False in that case
+        and the caller should re-read the user and retry.
+        """
+        try:
+            names = [location['name'] for location in locations]
+            result = cls.collection.update_one(
+                {'email': email, 'locations.name': {'$nin': names}},
+                {
+                    '$push': {'locations': {'$each': locations}},
+                    '$set': {'updated_at': datetime.utcnow()}
+                }
+            )
+            cls.invalidate_cache(email)
+            if result.matched_count:
+                LocationSubscription.subscribe_many(email, locations)
+                logger.info(f"Added {len(locations)} locations for user {email}")
+            return result.matched_count > 0
+        except Exception as e:
+            logger.error(f"Error adding locations for user {email}: {str(e)}")
+            raise
+
+    @classmethod
+    def resolve_pending_location(cls, email, name, location):
+        """Replace a pending location with its geocoded data"""
+        try:
+            result = cls.collection.update_one(
+                {'email': email, 'locations': {'$elemMatch': {'name': name, 'status': 'pending'}}},
+                {'$set': {'locations.$': location, 'updated_at': datetime.utcnow()}}
+            )
+            cls.invalidate_cache(email)
+            if result.matched_count:
+                LocationSubscription.subscribe(email, location)
+                logger.info(f"Resolved pending location {name} for user {email}")
+            return result.matched_count > 0
+        except Exception as e:
+            logger.error(f"Error resolving location {name} for user {email}: {str(e)}")
+            raise
+
+    @classmethod
+    def fail_pending_location(cls, email, name, error):
+        """Mark a pending location as failed so the user can see and remove it"""
+        try:
+            cls.collection.update_one(
+                {'email': email, 'locations': {'$elemMatch': {'name': name, 'status': 'pending'}}},
+                {'$set': {
+                    'locations.$.status': 'failed',
+                    'locations.$.error': error,
+                    'updated_at': datetime.utcnow()
+                }}
+            )
+            cls.invalidate_cache(email)
+            logger.info(f"Geocoding failed for location {name} of user {email}: {error}")
+        except Exception as e:
+            logger.error(f"Error failing location {name} for user {email}: {str(e)}")
+            raise
+
     def update_preferences(self, preferences):
         try:
-            self.warning_preferences.update(preferences)
-            self.save()
+            self._update(
+                {},
+                {'$set': self._dotted_fields('warning_preferences', preferences)},
+                ['warning_preferences']
+            )
             logger.info(f"Updated preferences for user {self.email}")
         except Exception as e:
             logger.error(f"Error updating preferences for user {self.email}: {str(e)}")
             raise
 
     @classmethod
-    def get_all_active(cls):
+    def iter_active(cls, batch_size=None, emails=None, require_tokens=True):
+        """
+        Stream users that have locations and Google tokens.
+
+        Filtering and projection happen server-side and the cursor is read
+        batch_size documents at a time, so memory stays flat regardless of
+        the number of users. Tokens are not loaded.
+
+        Args:
+            batch_size (int): Cursor batch size (default: USER_BATCH_SIZE)
+            emails (list): Only consider these users
+            require_tokens (bool): Skip users without a Google access token
+
+        Yields:
+            ActiveUser: email, locations (name/lat/lon only) and warning preferences
+        """
         try:
-            users = []
-            for data in cls.collection.find():
-                if '_id' in data:
-                    data['_id'] = str(data['_id'])
-                users.append(cls(**data))
-            return users
+            query = dict(cls.ACTIVE_FILTER)
+            if not require_tokens:
+                query.pop('google_tokens.access_token')
+            if emails is not None:
+                query['email'] = {'$in': list(emails)}
+
+            cursor = cls.collection.find(
+                query,
+                cls.ACTIVE_PROJECTION,
+                batch_size=batch_size or Config.USER_BATCH_SIZE
+            )
+            for data in cursor:
+                yield ActiveUser(
+                    email=data['email'],
+                    locations=data.get('locations') or [],
+                    warning_preferences=data.get('warning_preferences') or {}
+                )
         except Exception as e:
-            logger.error(f"Error getting all active users: {str(e)}")
+            logger.error(f"Error iterating active users: {str(e)}")
             raise
 
     def to_dict(self):
@@ -1,14 +1,30 @@
-from datetime import datetime
-from pymongo import MongoClient
+import base64
+from datetime import datetime, timedelta, timezone
+import json
+import logging
+from pymongo import ASCENDING, DESCENDING, InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from bson import ObjectId
+from bson.errors import InvalidId
 from ..config import Config
+from .db import LazyCollection
 
-client = MongoClient(Config.MONGO_URI)
-db = client[Config.MONGO_DB_NAME]
+logger = logging.getLogger(__name__)
 
 class Warning:
-    collection = db.warnings
-    history_collection = db.warning_history
+    collection = LazyCollection('warnings')
+    history_collection = LazyCollection('warning_history')
+    # Old history records, bucketed per user and month
+    archive_collection = LazyCollection('warning_history_archive')
+
+    # History doubles as the "already processed" record, so it must outlive any warning
+    MIN_HISTORY_RETENTION_DAYS = 14
+
+    # Fields of a fetched warning kept in the active warnings store
+    STORED_FIELDS = ('type', 'severity', 'start_time', 'end_time', 'description', 'impact', 'recommendations',
+                     'location')
+    # Stored only so shard workers can rebuild the matcher; not served to the dashboard
+    INTERNAL_FIELDS = ('location', 'geometry', 'warnid', 'created_at', 'updated_at', 'expires_at')
     
     def __init__(self, type, severity, start_time, end_time, location, description, warning_id=None, _id=None):
         self._id = _id
@@ -21,6 +37,43 @@ class Warning:
         self.warning_id = warning_id  # External ID from Geosphere
         self.created_at = datetime.utcnow()
     
+    @classmethod
+    def ensure_indexes(cls):
+        """Create the warning and history indexes; called at startup, not on import"""
+        cls.collection.create_index('warning_id', unique=True)
+        cls.collection.create_index('warnid')
+        cls.collection.create_index('start_time')
+        cls.collection.create_index('end_time')
+        # Serves the dashboard query: the user's cells, then the time window
+        cls.collection.create_index([('cells', ASCENDING), ('end_time', ASCENDING)])
+        cls.collection.create_index('expires_at', expireAfterSeconds=0)
+
+        cls.history_collection.create_index(
+            [('user_email', ASCENDING), ('warning_id', ASCENDING)],
+            unique=True
+        )
+        # Serves the history page query: equality on user, keyset on (processed_at, _id)
+        cls.history_collection.create_index(
+            [('user_email', ASCENDING), ('processed_at', DESCENDING), ('_id', DESCENDING)]
+        )
+        if Config.WARNING_HISTORY_ARCHIVE:
+            cls.archive_collection.create_index(
+                [('user_email', ASCENDING), ('month', ASCENDING)],
+                unique=True
+            )
+        else:
+            # Without archival, expire old records directly
+            cls.history_collection.create_index(
+                'processed_at',
+                name='processed_at_ttl',
+                expireAfterSeconds=cls.history_retention_days() * 24 * 3600
+            )
+        logger.info("Warning indexes ensured")
+
+    @classmethod
+    def history_retention_days(cls):
+        return max(Config.WARNING_HISTORY_RETENTION_DAYS, cls.MIN_HISTORY_RETENTION_DAYS)
+
     @classmethod
     def find_active(cls):
         current_time = datetime.utcnow()
@@ -31,6 +84,99 @@ class Warning:
             })
         ]
     
+    @classmethod
+    def upsert_many(cls, warnings, cells_by_id):
+        """
+        Materialise one cycle's warnings into the active warnings store.
+
+        Each warning is upserted by warning_id together with the location
+        cells it reaches and its geometry, and expires WARNING_STORE_EXPIRY_HOURS after it
+        ends. Stored versions superseded by a new chgid/verlaufid of the
+        same warnid are removed; warnings are otherwise never deleted here,
+        so a failed fetch cannot empty the store.
+
+        Args:
+            warnings (list): Warnings as returned by GeosphereService
+            cells_by_id (dict): Warning id -> iterable of cell ids
+
+        Returns:
+            int: Number of warnings written
+        """
+        if not warnings:
+            return 0
+
+        now = datetime.utcnow()
+        expiry = timedelta(hours=Config.WARNING_STORE_EXPIRY_HOURS)
+        operations = []
+        warnids = set()
+        for warning in warnings:
+            warning_id = warning['warning_id']
+            warnids.add(warning_id.split('c', 1)[0])
+            document = {field: warning.get(field) for field in cls.STORED_FIELDS}
+            document.update({
+                'geometry': (warning.get('raw_data') or {}).get('geometry'),
+                'warnid': warning_id.split('c', 1)[0],
+                'cells': sorted(cells_by_id.get(warning_id, ())),
+                'updated_at': now,
+                'expires_at': warning['end_time'] + expiry
+            })
+            operations.append(UpdateOne(
+                {'warning_id': warning_id},
+                {'$set': document, '$setOnInsert': {'created_at': now}},
+                upsert=True
+            ))
+
+        try:
+            cls.collection.bulk_write(operations, ordered=False)
+            cls.collection.delete_many({
+                'warnid': {'$in': list(warnids)},
+                'warning_id': {'$nin': [warning['warning_id'] for warning in warnings]}
+            })
+        except Exception as e:
+            logger.error(f"Error storing {len(operations)} active warnings: {str(e)}")
+            raise
+        return len(operations)
+
+    @classmethod
+    def find_active_for_cells(cls, cell_ids, window_days=7):
+        """
+        Return stored warnings reaching any of the given cells that have not
+        ended and start within window_days, ordered by start time.
+        """
+        if not cell_ids:
+            return []
+        now = datetime.utcnow()
+        return list(cls.collection.find(
+            {
+                'cells': {'$in': list(cell_ids)},
+                'end_time': {'$gt': now},
+                'start_time': {'$lte': now + timedelta(days=window_days)}
+            },
+            dict({'_id': 0}, **{field: 0 for field in cls.INTERNAL_FIELDS})
+        ).sort('start_time', ASCENDING))
+
+    @classmethod
+    def find_for_processing(cls, warning_ids):
+        """
+        Load stored warnings that have not ended in the shape GeosphereService
+        returns them, with UTC-aware times, for matching and calendar events.
+        Warnings without geometry keep their cells in place of the fanned-out
+        locations (see LocationIndex.locations_in_cells).
+        """
+        if not warning_ids:
+            return []
+        warnings = []
+        for document in cls.collection.find(
+            {'warning_id': {'$in': list(warning_ids)}, 'end_time': {'$gt': datetime.utcnow()}},
+            {'_id': 0, 'warnid': 0, 'created_at': 0, 'updated_at': 0, 'expires_at': 0}
+        ):
+            geometry = document.pop('geometry', None)
+            document['raw_data'] = {'geometry': geometry} if geometry else {}
+            document['start_time'] = document['start_time'].replace(tzinfo=timezone.utc)
+            document['end_time'] = document['end_time'].replace(tzinfo=timezone.utc)
+            warnings.append(document)
+        return warnings
+
     def save(self):
         data = {
             'type': self.type,
@@ -55,20 +201,190 @@ class Warning:
             'warning_id': warning_id
         }) is not None
     
+    @classmethod
+    def get_processed_ids(cls, user_emails, warning_ids):
+        """
+        Fetch which of the given warnings were already processed for the
+        given users, in one query served by the (user_email, warning_id)
+        unique index.
+
+        Returns:
+            dict: User email -> set of processed warning ids
+        """
+        processed = {}
+        if not user_emails or not warning_ids:
+            return processed
+
+        cursor = cls.history_collection.find(
+            {'user_email': {'$in': list(user_emails)}, 'warning_id': {'$in': list(warning_ids)}},
+            {'_id': 0, 'user_email': 1, 'warning_id': 1}
+        )
+        for record in cursor:
+            processed.setdefault(record['user_email'], set()).add(record['warning_id'])
+        return processed
+
     @classmethod
     def mark_processed(cls, user_email, warning_id, calendar_event_id):
-        """Mark warning as processed for user"""
-        cls.history_collection.insert_one({
-            'user_email': user_email,
-            'warning_id': warning_id,
-            'calendar_event_id': calendar_event_id,
-            'processed_at': datetime.utcnow()
-        })
+        """
+        Mark warning as processed for user.
+
+        Returns:
+            bool: False if it was already marked, e.g. by a concurrent processor
+        """
+        try:
+            cls.history_collection.insert_one({
+                'user_email': user_email,
+                'warning_id': warning_id,
+                'calendar_event_id': calendar_event_id,
+                'processed_at': datetime.utcnow()
+            })
+            return True
+        except DuplicateKeyError:
+            logger.info(f"Warning {warning_id} was already processed for user {user_email}")
+            return False
+
+    @classmethod
+    def mark_processed_many(cls, records):
+        """
+        Insert several history records with one unordered bulk write.
+
+        Args:
+            records (list): Dicts with user_email, warning_id, calendar_event_id and processed_at
+
+        Returns:
+            tuple: (records that already existed, records that failed for another reason)
+        """
+        if not records:
+            return [], []
+        try:
+            cls.history_collection.bulk_write([InsertOne(dict(record)) for record in records], ordered=False)
+            return [], []
+        except BulkWriteError as e:
+            duplicates = []
+            failed = []
+            for error in e.details.get('writeErrors', []):
+                record = records[error['index']]
+                if error.get('code') == 11000:
+                    duplicates.append(record)
+                else:
+                    logger.error(f"Error writing history for warning {record['warning_id']}: {error.get('errmsg')}")
+                    failed.append(record)
+            return duplicates, failed
+
+    @classmethod
+    def find_history(cls, user_email, warning_ids):
+        """Return the stored history records of a user for the given warnings"""
+        return list(cls.history_collection.find(
+            {'user_email': user_email, 'warning_id': {'$in': list(warning_ids)}},
+            {'_id': 0, 'warning_id': 1, 'calendar_event_id': 1}
+        ))
 
     @classmethod
     def get_user_history(cls, user_email, limit=50):
         """Get warning history for user"""
-        return list(cls.history_collection.find(
-            {'user_email': user_email},
-            {'_id': 0}
-        ).sort('processed_at', -1).limit(limit))
+        records, _ = cls.get_user_history_page(user_email, limit)
+        return records
+
+    @classmethod
+    def get_user_history_page(cls, user_email, limit=50, after=None):
+        """
+        Get one page of a user's warning history, newest first.
+
+        Pages are keyed on (processed_at, _id) rather than skipped over, so
+        every page costs the same regardless of how deep it is.
+
+        Args:
+            user_email (str): User to read
+            limit (int): Page size
+            after (str): Cursor returned with the previous page
+
+        Returns:
+            tuple: (records, cursor for the next page or None)
+
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        query = {'user_email': user_email}
+        if after:
+            processed_at, last_id = cls._decode_cursor(after)
+            query['$or'] = [
+                {'processed_at': {'$lt': processed_at}},
+                {'processed_at': processed_at, '_id': {'$lt': last_id}}
+            ]
+
+        records = list(cls.history_collection.find(query).sort(
+            [('processed_at', DESCENDING), ('_id', DESCENDING)]
+        ).limit(limit + 1))
+
+        cursor = None
+        if len(records) > limit:
+            records = records[:limit]
+            cursor = cls._encode_cursor(records[-1])
+        for record in records:
+            record.pop('_id')
+        return records, cursor
+
+    @staticmethod
+    def _encode_cursor(record):
+        payload = json.dumps([record['processed_at'].isoformat(), str(record['_id'])])
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    @staticmethod
+    def _decode_cursor(cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            processed_at, last_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            return datetime.fromisoformat(processed_at), ObjectId(last_id)
+        except (ValueError, TypeError, InvalidId) as e:
+            raise ValueError(f"Invalid history cursor: {cursor}") from e
+
+    @classmethod
+    def archive_history(cls, batch_size=None, max_batches=100):
+        """
+        Move history records older than the retention period into the
+        archive, as compact per-user monthly buckets.
+
+        Records are added to buckets with $addToSet before the originals
+        are deleted, so an interrupted or concurrent run never loses or
+        duplicates a record.
+
+        Returns:
+            int: Number of records archived
+        """
+        batch_size = batch_size or Config.WARNING_HISTORY_ARCHIVE_BATCH
+        cutoff = datetime.utcnow() - timedelta(days=cls.history_retention_days())
+        archived = 0
+
+        for _ in range(max_batches):
+            records = list(cls.history_collection.find(
+                {'processed_at': {'$lt': cutoff}}
+            ).sort('processed_at', ASCENDING).limit(batch_size))
+            if not records:
+                break
+
+            buckets = {}
+            for record in records:
+                key = (record['user_email'], record['processed_at'].strftime('%Y-%m'))
+                buckets.setdefault(key, []).append({
+                    'w': record['warning_id'],
+                    'e': record.get('calendar_event_id'),
+                    't': record['processed_at']
+                })
+
+            cls.archive_collection.bulk_write([
+                UpdateOne(
+                    {'user_email': user_email, 'month': month},
+                    {'$addToSet': {'records': {'$each': entries}}},
+                    upsert=True
+                )
+                for (user_email, month), entries in buckets.items()
+            ], ordered=False)
+            cls.history_collection.delete_many({'_id': {'$in': [record['_id'] for record in records]}})
+            archived += len(records)
+
+            if len(records) < batch_size:
+                break
+
+        if archived:
+            logger.info(f"Archived {archived} warning history records older than {cutoff.date()}")
+        return archived
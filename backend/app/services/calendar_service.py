@@ -1,5 +1,10 @@
+import base64
+import hashlib
 import logging
+import time
 from datetime import datetime
+import httplib2
+from google_auth_httplib2 import AuthorizedHttp
 from google.oauth2.credentials import Credentials
 from google.auth.transport.requests import Request
 from googleapiclient.discovery import build
@@ -10,6 +15,9 @@ from ..config import Config
 
 logger = logging.getLogger(__name__)
 
+# base64.b32hexencode needs Python 3.10; map the standard base32 alphabet instead
+_BASE32HEX = bytes.maketrans(b'ABCDEFGHIJKLMNOPQRSTUVWXYZ234567', b'0123456789ABCDEFGHIJKLMNOPQRSTUV')
+
 class GoogleCalendarService:
     def __init__(self, user_email):
         self.logger = logging.getLogger(__name__)
@@ -18,7 +26,9 @@ class GoogleCalendarService:
             raise ValueError(f"User not found: {user_email}")
         
         self.credentials = self._get_credentials()
-        self.service = build('calendar', 'v3', credentials=self.credentials)
+        # A socket timeout so a hanging Google response cannot hold a worker thread indefinitely
+        http = AuthorizedHttp(self.credentials, http=httplib2.Http(timeout=Config.GOOGLE_API_TIMEOUT))
+        self.service = build('calendar', 'v3', http=http)
 
     def _get_credentials(self):
         """Get and refresh Google credentials if needed"""
@@ -51,30 +61,7 @@ class GoogleCalendarService:
     def create_warning_event(self, warning):
         """Create a calendar event for a warning"""
         try:
-            if not isinstance(warning, dict):
-                raise ValueError("Warning must be a dictionary")
-
-            event = {
-                'summary': f"Weather Warning: {warning['type'].capitalize()}",
-                'description': warning['description'],
-                'start': {
-                    'dateTime': warning['start_time'].isoformat(),
-                    'timeZone': 'Europe/Vienna',
-                },
-                'end': {
-                    'dateTime': warning['end_time'].isoformat(),
-                    'timeZone': 'Europe/Vienna',
-                },
-                'colorId': self._get_severity_color(warning['severity']),
-                'location': warning['location'].get('area', ''),
-                'reminders': {
-                    'useDefault': False,
-                    'overrides': [
-                        {'method': 'popup', 'minutes': 60},
-                        {'method': 'email', 'minutes': 120}
-                    ]
-                }
-            }
+            event = self._build_event(warning)
             
             logger.debug(f"Creating calendar event: {event}")
             created_event = self.service.events().insert(calendarId='primary', body=event).execute()
@@ -83,12 +70,144 @@ class GoogleCalendarService:
             return created_event
 
         except HttpError as e:
+            if self._is_conflict(e):
+                logger.info(f"Calendar event {event['id']} already exists")
+                return {'id': event['id']}
             logger.error(f"Google Calendar API error: {str(e)}")
             raise
         except Exception as e:
             logger.error(f"Error creating calendar event: {str(e)}")
             raise
 
+    def create_warning_events(self, warnings, on_created=None):
+        """
+        Create calendar events for several warnings with batch requests.
+
+        Warnings are sent in batches of up to CALENDAR_BATCH_SIZE inserts
+        (the Calendar API allows 50), each one HTTP round trip. Sub-requests
+        that fail with a rate limit or server error, or a batch that fails as
+        a whole (e.g. a timeout), are retried with backoff up to
+        CALENDAR_MAX_ATTEMPTS times; other failures are not retried.
+
+        Google may have carried out inserts whose responses were lost, so
+        every event carries an id derived from the user and the warning: a
+        retried insert that already happened fails with 409 and is reported
+        as created.
+
+        Args:
+            warnings (list): Warnings to create events for
+            on_created (callable): Called with (warning, event) as soon as each event is created
+
+        Returns:
+            list: (warning, created event or None, exception or None) per warning, in order
+        """
+        results = [None] * len(warnings)
+        pending = []
+        for index, warning in enumerate(warnings):
+            try:
+                pending.append((index, self._build_event(warning)))
+            except Exception as e:
+                logger.error(f"Error building calendar event for warning {warning.get('warning_id')}: {str(e)}")
+                results[index] = (warning, None, e)
+
+        batch_size = max(1, min(Config.CALENDAR_BATCH_SIZE, 50))
+        for attempt in range(1, Config.CALENDAR_MAX_ATTEMPTS + 1):
+            if not pending:
+                break
+            if attempt > 1:
+                time.sleep(min(0.5 * 2 ** (attempt - 2), 8))
+
+            retry = []
+            for start in range(0, len(pending), batch_size):
+                chunk = pending[start:start + batch_size]
+                responses = self._execute_insert_batch(chunk)
+                for index, event in chunk:
+                    warning = warnings[index]
+                    created_event, error = responses[index]
+                    if error is not None and self._is_conflict(error):
+                        created_event, error = {'id': event['id']}, None
+                    if error is None:
+                        results[index] = (warning, created_event, None)
+                        if on_created:
+                            on_created(warning, created_event)
+                    elif attempt < Config.CALENDAR_MAX_ATTEMPTS and self._is_retryable(error):
+                        retry.append((index, event))
+                    else:
+                        logger.error(f"Error creating calendar event for warning {warning.get('warning_id')}: {str(error)}")
+                        results[index] = (warning, None, error)
+
+            if retry:
+                logger.warning(f"Retrying {len(retry)} failed calendar inserts (attempt {attempt + 1})")
+            pending = retry
+
+        created = sum(1 for _, event, _ in results if event is not None)
+        logger.info(f"Created {created} of {len(warnings)} calendar events in batch for user {self.user.email}")
+        return results
+
+    def _execute_insert_batch(self, chunk):
+        """Send (index, event body) inserts as one batch; returns index -> (event, exception)"""
+        responses = {}
+
+        def callback(request_id, response, exception):
+            responses[int(request_id)] = (response, exception)
+
+        batch = self.service.new_batch_http_request(callback=callback)
+        for index, event in chunk:
+            batch.add(self.service.events().insert(calendarId='primary', body=event), request_id=str(index))
+        try:
+            batch.execute()
+        except Exception as e:
+            # The batch itself failed; every request in it failed with the same error
+            logger.error(f"Google Calendar batch request failed: {str(e)}")
+            return {index: responses.get(index, (None, e)) for index, _ in chunk}
+        return {index: responses.get(index, (None, RuntimeError('No response in batch'))) for index, _ in chunk}
+
+    @staticmethod
+    def event_id(user_email, warning_id):
+        """Deterministic event id (base32hex, as the Calendar API requires) for a user's warning"""
+        digest = hashlib.sha1(f"{user_email}:{warning_id}".encode('utf-8')).digest()
+        return base64.b32encode(digest).translate(_BASE32HEX).decode('ascii').rstrip('=').lower()
+
+    @staticmethod
+    def _is_conflict(error):
+        return isinstance(error, HttpError) and getattr(error.resp, 'status', None) == 409
+
+    @staticmethod
+    def _is_retryable(error):
+        if not isinstance(error, HttpError):
+            return True
+        status = getattr(error.resp, 'status', None)
+        if status in (429, 500, 502, 503, 504):
+            return True
+        return status == 403 and 'rate limit' in str(getattr(error, 'reason', '')).lower()
+
+    def _build_event(self, warning):
+        if not isinstance(warning, dict):
+            raise ValueError("Warning must be a dictionary")
+
+        return {
+            'id': self.event_id(self.user.email, warning['warning_id']),
+            'summary': f"Weather Warning: {warning['type'].capitalize()}",
+            'description': warning['description'],
+            'start': {
+                'dateTime': warning['start_time'].isoformat(),
+                'timeZone': 'Europe/Vienna',
+            },
+            'end': {
+                'dateTime': warning['end_time'].isoformat(),
+                'timeZone': 'Europe/Vienna',
+            },
+            'colorId': self._get_severity_color(warning['severity']),
+            'location': warning['location'].get('area', ''),
+            'reminders': {
+                'useDefault': False,
+                'overrides': [
+                    {'method': 'popup', 'minutes': 60},
+                    {'method': 'email', 'minutes': 120}
+                ]
+            }
+        }
+
     def _get_severity_color(self, severity):
         """Map severity to Google Calendar color IDs"""
         color_map = {
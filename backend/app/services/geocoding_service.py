@@ -0,0 +1,378 @@
+import atexit
+import logging
+import threading
+import time
+from datetime import datetime
+from threading import Lock
+from typing import Any, Dict, List, Optional
+from ..config import Config
+from ..models.geocode_cache import GeocodeCache
+from ..models.geocode_job import GeocodeJob
+from ..models.user import User
+from ..utils.gazetteer import get_gazetteer
+from ..utils.geo import LocationNotFoundError, geocode_location, normalize_location_query, validate_coordinates
+from ..utils.lru import LRUCache
+from .leader_lease import LeaderLease
+
+logger = logging.getLogger(__name__)
+
+class ImportConflictError(RuntimeError):
+    """The user's locations kept changing while an import was being written"""
+
+class GeocodingService:
+    """
+    Geocoding with a two-tier cache in front of Nominatim: an in-process
+    LRU backed by the shared Mongo geocode_cache collection. "Not found"
+    results are cached too, with a shorter TTL. Names that match exactly
+    one place in the offline gazetteer never reach either cache.
+
+    Names that miss the cache can be queued instead of geocoded inline; a
+    background worker resolves them in order, at most one upstream request
+    per GEOCODE_MIN_INTERVAL, and patches the user's pending location.
+    Only the holder of the geocoding-worker lease runs the worker, so the
+    upstream rate limit holds across all workers and replicas.
+    """
+
+    def __init__(self):
+        self.memory_cache = LRUCache(max_entries=Config.GEOCODE_CACHE_MAX_ENTRIES)
+        self.ttl = Config.GEOCODE_CACHE_TTL
+        self.negative_ttl = Config.GEOCODE_NEGATIVE_TTL
+        self.min_interval = Config.GEOCODE_MIN_INTERVAL
+        self._next_request_at = 0.0
+        self._rate_lock = Lock()
+        self.worker_running = False
+        self.worker_thread = None
+        self.worker_lease = LeaderLease('geocoding-worker')
+        atexit.register(self.worker_lease.stop)
+        self._worker_lock = Lock()
+        self.stats = {'gazetteer_hits': 0, 'gazetteer_misses': 0}
+
+    def lookup_cached(self, location_name: str, language: str = 'en') -> Optional[Dict[str, Any]]:
+        """
+        Resolve a location name from the gazetteer and the caches only.
+
+        Returns:
+            dict: Location data, or None if the name is not cached
+
+        Raises:
+            LocationNotFoundError: If the name is cached as not found
+        """
+        location = self._lookup_gazetteer(location_name)
+        if location is not None:
+            return location
+
+        key = normalize_location_query(location_name, language)
+
+        entry = self.memory_cache.get(key)
+        if entry is None:
+            entry = self._get_shared(key)
+            if entry is None:
+                return None
+            self.memory_cache.set(key, entry, self._remaining_ttl(entry))
+
+        logger.debug(f"Geocode cache hit for {key}")
+        if not entry['found']:
+            raise LocationNotFoundError(f"Could not find coordinates for location: {location_name}")
+        return dict(entry['location'], name=location_name)
+
+    def lookup_cached_many(self, location_names: List[str], language: str = 'en') -> Dict[str, Optional[Dict]]:
+        """
+        Resolve several location names from the gazetteer and the caches,
+        using a single shared-cache query for everything not held in memory.
+
+        Returns:
+            dict: Name -> cache entry ({'found', 'location'}), or None if not cached
+        """
+        entries = {}
+        missing = {}
+        for name in location_names:
+            location = self._lookup_gazetteer(name)
+            if location is not None:
+                entries[name] = {'found': True, 'location': location}
+                continue
+
+            key = normalize_location_query(name, language)
+            entries[name] = self.memory_cache.get(key)
+            if entries[name] is None:
+                missing.setdefault(key, []).append(name)
+
+        for key, entry in self._get_shared_many(list(missing)).items():
+            self.memory_cache.set(key, entry, self._remaining_ttl(entry))
+            for name in missing[key]:
+                entries[name] = entry
+        return entries
+
+    def geocode(self, location_name: str, language: str = 'en') -> Dict[str, Any]:
+        """
+        Geocode a location name, consulting the caches first.
+
+        Raises:
+            LocationNotFoundError: If the name is known not to resolve
+            ValueError: If the geocoder fails
+        """
+        location = self.lookup_cached(location_name, language)
+        if location is not None:
+            return location
+
+        key = normalize_location_query(location_name, language)
+        self._wait_for_rate_limit()
+        try:
+            location = geocode_location(location_name, language)
+        except LocationNotFoundError:
+            self._store(key, None, self.negative_ttl)
+            raise
+        self._store(key, self._strip_name(location), self.ttl)
+        return location
+
+    def suggest(self, prefix: str, limit: int = 10):
+        """Return gazetteer places whose name or postcode starts with prefix"""
+        gazetteer = get_gazetteer()
+        if gazetteer is None:
+            return []
+        return gazetteer.suggest(prefix, limit)
+
+    def _lookup_gazetteer(self, location_name):
+        gazetteer = get_gazetteer()
+        if gazetteer is None:
+            return None
+        place = gazetteer.lookup_exact(location_name)
+        if place is None:
+            self.stats['gazetteer_misses'] += 1
+            return None
+
+        self.stats['gazetteer_hits'] += 1
+        logger.debug(f"Gazetteer hit for {location_name}")
+        return {
+            'name': location_name,
+            'lat': place['lat'],
+            'lon': place['lon'],
+            'address': ', '.join(part for part in (
+                f"{place['postcode']} {place['name']}".strip(), place['state'], 'Austria'
+            ) if part),
+            'raw': {'source': 'gazetteer', 'postcode': place['postcode']}
+        }
+
+    def get_stats(self):
+        """Gazetteer coverage and how many lookups it answered offline"""
+        gazetteer = get_gazetteer()
+        return dict(self.stats, gazetteer=gazetteer.stats() if gazetteer is not None else None)
+
+    def _wait_for_rate_limit(self):
+        """Space out upstream geocoder calls made by this process"""
+        with self._rate_lock:
+            now = time.monotonic()
+            wait = self._next_request_at - now
+            if wait > 0:
+                time.sleep(wait)
+            self._next_request_at = max(now, self._next_request_at) + self.min_interval
+
+    def enqueue(self, user, location_name: str) -> Dict[str, Any]:
+        """
+        Add a pending location to the user and queue it for background geocoding.
+
+        Returns:
+            dict: The pending location record (or the existing location with that name)
+        """
+        for location in user.locations:
+            if location.get('name') == location_name:
+                return location
+
+        pending = {'name': location_name, 'status': 'pending'}
+        user.add_location(pending)
+        GeocodeJob.enqueue(user.email, location_name)
+        logger.info(f"Queued location {location_name} for geocoding for user {user.email}")
+        return pending
+
+    def import_locations(self, user, rows: List[Dict], language: str = 'en') -> List[Dict]:
+        """
+        Add many locations to a user at once.
+
+        Rows with coordinates, and names found in the gazetteer or the caches,
+        are added as resolved locations; the remaining names are added as
+        pending and queued for the background worker, which geocodes them at
+        the rate-limited pace. The new locations, resolved and pending, are
+        written in one atomic update, but each pending one is resolved later
+        by its own resolve_pending_location update: the import is only
+        complete once none of its 'queued' rows is pending any more. Names
+        are deduplicated the same way as User.add_location.
+
+        Args:
+            user: User to import into
+            rows (list): Dicts with a 'name' and optional 'lat', 'lon' and 'address'
+
+        Returns:
+            list: Per-row results with 'row', 'name', 'status' and 'location' or 'error'
+
+        Raises:
+            ImportConflictError: If concurrent updates kept the import from being written
+        """
+        existing = {location.get('name') for location in user.locations}
+        results = []
+        batch = {}  # name -> result of the first row with that name
+
+        for index, row in enumerate(rows):
+            name = str(row.get('name') or '').strip()
+            result = {'row': index, 'name': name}
+            results.append(result)
+
+            if not name:
+                result.update(status='invalid', error='Location name required')
+            elif name in existing:
+                result['status'] = 'exists'
+            elif name in batch:
+                result['status'] = 'duplicate'
+            elif row.get('lat') not in (None, '') or row.get('lon') not in (None, ''):
+                if not validate_coordinates(row.get('lat'), row.get('lon')):
+                    result.update(status='invalid', error='Invalid coordinates')
+                    continue
+                location = {'name': name, 'lat': float(row['lat']), 'lon': float(row['lon'])}
+                if row.get('address'):
+                    location['address'] = row['address']
+                result.update(status='added', location=location)
+                batch[name] = result
+            else:
+                result['status'] = None  # Resolved below
+                batch[name] = result
+
+        unresolved = [name for name, result in batch.items() if result['status'] is None]
+        entries = self.lookup_cached_many(unresolved, language)
+        for name in unresolved:
+            result = batch[name]
+            entry = entries.get(name)
+            if entry is None:
+                result.update(status='queued', location={'name': name, 'status': 'pending'})
+            elif entry['found']:
+                result.update(status='added', location=dict(entry['location'], name=name))
+            else:
+                result.update(status='not_found', error='Location not found')
+
+        new_results = self._commit_import(user, batch)
+        queued = [result['name'] for result in new_results if result['status'] == 'queued']
+        GeocodeJob.enqueue_many(user.email, queued)
+
+        logger.info(
+            f"Imported {len(rows)} rows for user {user.email}: "
+            f"{len(new_results) - len(queued)} added, {len(queued)} queued"
+        )
+        return results
+
+    def _commit_import(self, user, batch, max_attempts=5):
+        """Write the new locations of an import, dropping names added concurrently"""
+        for attempt in range(max_attempts):
+            if attempt:
+                time.sleep(min(0.05 * 2 ** attempt, 1.0))
+            new_results = [result for result in batch.values() if result['status'] in ('added', 'queued')]
+            if not new_results:
+                return []
+
+            locations = [result['location'] for result in new_results]
+            if User.add_locations(user.email, locations):
+                user.locations.extend(locations)
+                return new_results
+
+            # Another request added one of the names in the meantime
+            current = User.find_by_email(user.email)
+            existing = {location.get('name') for location in (current.locations if current else [])}
+            for result in new_results:
+                if result['name'] in existing:
+                    result.pop('location')
+                    result['status'] = 'exists'
+
+        raise ImportConflictError(f"Could not import locations for user {user.email}: concurrent updates")
+
+    def start_worker(self):
+        """Start the background geocoding worker"""
+        with self._worker_lock:
+            if self.worker_thread and self.worker_thread.is_alive():
+                logger.warning("Geocoding worker already running")
+                return
+
+            self.worker_running = True
+            self.worker_lease.start()
+            self.worker_thread = threading.Thread(target=self._worker_loop)
+            self.worker_thread.daemon = True
+            self.worker_thread.start()
+            logger.info("Geocoding worker started")
+
+    def stop_worker(self):
+        """Stop the background geocoding worker"""
+        with self._worker_lock:
+            self.worker_running = False
+            if self.worker_thread:
+                self.worker_thread.join(timeout=30)
+                self.worker_thread = None
+            self.worker_lease.stop()
+            logger.info("Geocoding worker stopped")
+
+    def _worker_loop(self):
+        """Resolve queued location names in order"""
+        logger.info("Geocoding worker loop started")
+        while self.worker_running:
+            try:
+                if not self.worker_lease.is_leader():
+                    time.sleep(self.worker_lease.renew_interval)
+                    continue
+                job = GeocodeJob.claim_next()
+                if job is None:
+                    time.sleep(Config.GEOCODE_QUEUE_POLL_INTERVAL)
+                    continue
+                self._process_job(job)
+            except Exception as e:
+                logger.error(f"Error in geocoding worker loop: {str(e)}")
+                time.sleep(Config.GEOCODE_QUEUE_POLL_INTERVAL)
+
+    def _process_job(self, job):
+        email = job['user_email']
+        name = job['name']
+        try:
+            location = self.geocode(name)
+        except LocationNotFoundError:
+            User.fail_pending_location(email, name, 'Location not found')
+            GeocodeJob.complete(job['_id'])
+            return
+        except Exception as e:
+            logger.error(f"Geocoding job for {name} failed (attempt {job['attempts']}): {str(e)}")
+            if job['attempts'] >= Config.GEOCODE_MAX_ATTEMPTS:
+                User.fail_pending_location(email, name, 'Failed to geocode location')
+                GeocodeJob.fail(job['_id'], str(e))
+            else:
+                delay = min(Config.GEOCODE_RETRY_BACKOFF * 2 ** (job['attempts'] - 1), Config.GEOCODE_RETRY_MAX_BACKOFF)
+                logger.info(f"Retrying geocoding job for {name} in {delay:.0f}s")
+                GeocodeJob.retry(job['_id'], str(e), delay)
+            return
+
+        User.resolve_pending_location(email, name, location)
+        GeocodeJob.complete(job['_id'])
+
+    def _get_shared(self, key):
+        try:
+            return GeocodeCache.get(key)
+        except Exception as e:
+            logger.error(f"Error reading geocode cache for {key}: {str(e)}")
+            return None
+
+    def _get_shared_many(self, keys):
+        try:
+            return GeocodeCache.get_many(keys)
+        except Exception as e:
+            logger.error(f"Error reading geocode cache for {len(keys)} keys: {str(e)}")
+            return {}
+
+    def _store(self, key, location, ttl):
+        entry = {'found': location is not None, 'location': location}
+        self.memory_cache.set(key, entry, ttl)
+        try:
+            GeocodeCache.put(key, location, ttl)
+        except Exception as e:
+            logger.error(f"Error writing geocode cache for {key}: {str(e)}")
+
+    def _remaining_ttl(self, entry):
+        expires_at = entry.get('expires_at')
+        if expires_at is None:
+            return None
+        return max((expires_at - datetime.utcnow()).total_seconds(), 1)
+
+    @staticmethod
+    def _strip_name(location):
+        # The name is whatever the user typed; it is re-applied on every cache hit
+        return {key: value for key, value in location.items() if key != 'name'}
@@ -1,7 +1,13 @@
 import logging
 import requests
-from typing import Dict, Optional, List, Any
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from typing import Callable, Dict, Iterable, Optional, List, Any, Tuple
 from datetime import datetime, timezone
+from ..config import Config
+from shapely.geometry import Point
+from ..utils.geo import geometry_cache, plan_location_cells
+from ..utils.http_cache import ResponseCache
 
 logger = logging.getLogger(__name__)
 
@@ -13,44 +19,185 @@ class GeosphereService:
             'User-Agent': 'InfoCal/1.0'
         }
         self.timeout = 10
+        self.mode = Config.GEOSPHERE_MODE
+        self.snapshot_url = Config.GEOSPHERE_API_URL or f"{self.base_url}/getWarnstatus"
+        self.max_workers = max(1, Config.GEOSPHERE_MAX_WORKERS)
+        self.session = self._create_session()
+        self.cache = ResponseCache(
+            ttl=Config.GEOSPHERE_CACHE_TTL,
+            max_entries=Config.GEOSPHERE_CACHE_MAX_ENTRIES
+        )
+        self.grid_degrees = Config.LOCATION_GRID_DEGREES
+        self.last_plan_stats = {}
 
-    def get_warnings(self, locations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def _create_session(self) -> requests.Session:
+        """Create a keep-alive session shared by all fetch workers"""
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=max(Config.GEOSPHERE_POOL_MAXSIZE, 1),
+            pool_block=True
+        )
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update(self.headers)
+        return session
+
+    def get_warnings(self, locations: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
         Fetch warnings for all provided locations.
+
+        Locations are first collapsed into grid cells so that each cell is
+        queried once; the results are then fanned back out to every original
+        location through the warning's 'locations' list. In snapshot mode the
+        whole warning status is downloaded once and cells are resolved locally.
         
         Args:
-            locations: List of location dictionaries with lat and lon coordinates
+            locations: Location dictionaries with lat and lon coordinates (any iterable)
             
         Returns:
             List[Dict]: List of processed warnings
         """
+        cells, plan_stats = plan_location_cells(locations, self.grid_degrees)
+        self.last_plan_stats = plan_stats
+        logger.info(
+            f"Location plan: {plan_stats['locations']} locations -> {plan_stats['cells']} cells "
+            f"({plan_stats['cell_hits']} cell hits, collapse ratio {plan_stats['collapse_ratio']:.2%})"
+        )
+
         all_warnings = []
-        seen_warning_ids = set()
+        warnings_by_id = {}
+        cell_list = list(cells.values())
 
-        for location in locations:
-            try:
-                lat = location.get('lat')
-                lon = location.get('lon')
-                if lat is None or lon is None:
-                    logger.error(f"Missing coordinates for location: {location}")
-                    continue
-
-                warnings = self.get_warnings_for_location(lat, lon)
-                
-                # Deduplicate warnings based on warning_id
-                for warning in warnings:
-                    warning_id = warning.get('warning_id')
-                    if warning_id and warning_id not in seen_warning_ids:
-                        seen_warning_ids.add(warning_id)
-                        all_warnings.append(warning)
+        cell_warnings = None
+        if self.mode == 'snapshot':
+            cell_warnings = self._match_snapshot(cell_list)
+            if cell_warnings is None:
+                logger.warning("Warning snapshot unavailable, falling back to per-coordinate requests")
+        if cell_warnings is None:
+            cell_warnings = self._fetch_cells(cell_list)
+
+        # Results are merged in plan order so the concurrent path yields exactly
+        # the same warnings as the sequential one
+        for cell, warnings in zip(cell_list, cell_warnings):
+            self._merge_cell_warnings(cell, warnings, all_warnings, warnings_by_id)
+
+        return all_warnings
+
+    def _fetch_cells(self, cells: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """Fetch warnings for every cell, concurrently when more than one worker is configured"""
+        if self.max_workers == 1 or len(cells) <= 1:
+            return [self._fetch_cell(cell) for cell in cells]
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(cells)),
+                                thread_name_prefix='geosphere-fetch') as executor:
+            return list(executor.map(self._fetch_cell, cells))
+
+    def _fetch_cell(self, cell: Dict[str, Any]) -> List[Dict[str, Any]]:
+        # Query at a subscribed coordinate: near a warning region border the snapped
+        # centre can fall into the neighbouring region. The centre stays the cache key
+        lat, lon = self._query_point(cell)
+        try:
+            return self.get_warnings_for_location(lat, lon, cache_at=(cell['lat'], cell['lon']))
+        except Exception as e:
+            logger.error(f"Error fetching warnings for cell ({cell['lat']}, {cell['lon']}): {str(e)}")
+            return []
+
+    def _match_snapshot(self, cells: List[Dict[str, Any]]) -> Optional[List[List[Dict[str, Any]]]]:
+        """Resolve every cell against a single warning snapshot using point-in-polygon checks"""
+        snapshot = self.get_warning_snapshot()
+        if snapshot is None:
+            return None
+
+        cell_warnings = []
+        for cell in cells:
+            lat, lon = self._query_point(cell)
+            point = Point(lon, lat)
+            cell_warnings.append([
+                dict(warning, location=dict(warning['location'], lat=lat, lon=lon))
+                for warning, polygon in snapshot
+                if polygon.covers(point)
+            ])
+        return cell_warnings
+
+    def get_warning_snapshot(self, lang: str = 'en') -> Optional[List[Tuple[Dict[str, Any], Any]]]:
+        """
+        Fetch the full Austrian warning status in one request.
+
+        Args:
+            lang (str): Language for the warnings (default: 'en')
 
+        Returns:
+            List of (warning, WGS84 polygon) pairs, or None if the snapshot
+            could not be fetched
+        """
+        try:
+            logger.info(f"Fetching warning snapshot from {self.snapshot_url}")
+            return self._get_json(self.snapshot_url, {'lang': lang}, self._parse_snapshot)
+
+        except requests.RequestException as e:
+            logger.error(f"Error fetching warning snapshot from Geosphere: {str(e)}")
+            return None
+        except Exception as e:
+            logger.error(f"Error processing warning snapshot: {str(e)}")
+            return None
+
+    def _parse_snapshot(self, data: Any) -> Optional[List[Tuple[Dict[str, Any], Any]]]:
+        """Build (warning, polygon) pairs from a warning status response"""
+        if not isinstance(data, dict) or not isinstance(data.get('features'), list):
+            logger.error("Invalid snapshot response format")
+            return None
+
+        snapshot = []
+        for feature in data['features']:
+            geometry = feature.get('geometry') or {}
+            if feature.get('type') != 'Feature' or not geometry.get('coordinates'):
+                continue
+
+            props = feature.get('properties', {})
+            warning = self._build_warning(
+                props,
+                {'area': props.get('name', 'Unknown area')},
+                geometry
+            )
+            if not warning:
+                continue
+
+            try:
+                polygon = geometry_cache.get(warning['warning_id'], geometry)
             except Exception as e:
-                logger.error(f"Error fetching warnings for location {location}: {str(e)}")
+                logger.error(f"Error building polygon for warning {warning['warning_id']}: {str(e)}")
                 continue
+            if polygon is not None:
+                snapshot.append((warning, polygon))
 
-        return all_warnings
+        logger.info(f"Successfully fetched warning snapshot with {len(snapshot)} warnings")
+        return snapshot
+
+    @staticmethod
+    def _query_point(cell: Dict[str, Any]) -> Tuple[float, float]:
+        """The first (lowest) of the cell's subscribed coordinates, so the choice is stable"""
+        return min(cell['locations'])
+
+    def _merge_cell_warnings(self, cell: Dict[str, Any], warnings: List[Dict[str, Any]],
+                             all_warnings: List[Dict[str, Any]], warnings_by_id: Dict[str, Dict[str, Any]]):
+        """Deduplicate a cell's warnings and fan them out to the cell's original locations"""
+        cell_locations = [{'lat': lat, 'lon': lon} for lat, lon in sorted(cell['locations'])]
+
+        for warning in warnings:
+            warning_id = warning.get('warning_id')
+            if not warning_id:
+                continue
+
+            merged = warnings_by_id.get(warning_id)
+            if merged is None:
+                merged = dict(warning, locations=[])
+                warnings_by_id[warning_id] = merged
+                all_warnings.append(merged)
+            merged['locations'].extend(cell_locations)
 
-    def get_warnings_for_location(self, lat: float, lon: float, lang: str = 'en') -> List[Dict[str, Any]]:
+    def get_warnings_for_location(self, lat: float, lon: float, lang: str = 'en',
+                                  cache_at: Optional[Tuple[float, float]] = None) -> List[Dict[str, Any]]:
         """
         Fetch warnings for specific coordinates from Geosphere API.
         
@@ -58,6 +205,7 @@ class GeosphereService:
             lat (float): Latitude of the location
             lon (float): Longitude of the location
             lang (str): Language for the warnings (default: 'en')
+            cache_at (tuple): Coordinates to cache the response under instead (e.g. a grid cell centre)
             
         Returns:
             List[Dict]: List of processed warnings
@@ -72,61 +220,10 @@ class GeosphereService:
                 'lang': lang
             }
             
-            response = requests.get(
-                url,
-                params=params,
-                headers=self.headers,
-                timeout=self.timeout
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            logger.debug(f"Raw API response for coordinates ({lat}, {lon}): {data}")
-            
-            if not isinstance(data, dict) or 'properties' not in data:
-                logger.error("Invalid response format")
-                return []
-
-            warnings_data = data.get('properties', {}).get('warnings', [])
-            processed_warnings = []
-
-            for warning in warnings_data:
-                if warning.get('type') != 'Warning':
-                    continue
-                    
-                props = warning.get('properties', {})
-                raw_info = props.get('rawinfo', {})
-                
-                try:
-                    start_time = int(raw_info.get('start', 0))
-                    end_time = int(raw_info.get('end', 0))
-                    
-                    processed_warning = {
-                        'warning_id': f"w{props.get('warnid', '')}c{props.get('chgid', '')}v{props.get('verlaufid', '')}",
-                        'type': self._convert_warning_type(raw_info.get('wtype')),
-                        'severity': self._convert_severity(raw_info.get('wlevel')),
-                        'start_time': datetime.fromtimestamp(start_time, tz=timezone.utc),
-                        'end_time': datetime.fromtimestamp(end_time, tz=timezone.utc),
-                        'description': props.get('text', ''),
-                        'impact': props.get('auswirkungen', ''),
-                        'recommendations': props.get('empfehlungen', ''),
-                        'location': {
-                            'lat': lat,
-                            'lon': lon,
-                            'area': data.get('properties', {}).get('location', {}).get('properties', {}).get('name', 'Unknown area')
-                        },
-                        'raw_data': raw_info
-                    }
-                    
-                    logger.debug(f"Processed warning: {processed_warning}")
-                    processed_warnings.append(processed_warning)
-                    
-                except (ValueError, TypeError) as e:
-                    logger.error(f"Error processing warning {props.get('warnid')}: {str(e)}")
-                    continue
-
-            logger.info(f"Successfully fetched {len(processed_warnings)} warnings for location ({lat}, {lon})")
-            return processed_warnings
+            cache_params = None
+            if cache_at is not None:
+                cache_params = dict(params, lat=cache_at[0], lon=cache_at[1])
+            return self._get_json(url, params, lambda data: self._parse_location_warnings(data, lat, lon), cache_params)
 
         except requests.RequestException as e:
             logger.error(f"Error fetching warnings from Geosphere: {str(e)}")
@@ -135,6 +232,121 @@ class GeosphereService:
             logger.error(f"Error processing Geosphere response: {str(e)}")
             return []
 
+    def _parse_location_warnings(self, data: Any, lat: float, lon: float) -> List[Dict[str, Any]]:
+        """Build processed warnings from a getWarningsForCoords response"""
+        logger.debug(f"Raw API response for coordinates ({lat}, {lon}): {data}")
+        
+        if not isinstance(data, dict) or 'properties' not in data:
+            logger.error("Invalid response format")
+            return []
+
+        warnings_data = data.get('properties', {}).get('warnings', [])
+        processed_warnings = []
+
+        area = data.get('properties', {}).get('location', {}).get('properties', {}).get('name', 'Unknown area')
+
+        for warning in warnings_data:
+            if warning.get('type') != 'Warning':
+                continue
+
+            processed_warning = self._build_warning(
+                warning.get('properties', {}),
+                {'lat': lat, 'lon': lon, 'area': area}
+            )
+            if processed_warning:
+                processed_warnings.append(processed_warning)
+
+        logger.info(f"Successfully fetched {len(processed_warnings)} warnings for location ({lat}, {lon})")
+        return processed_warnings
+
+    def _get_json(self, url: str, params: Dict[str, Any], parse: Callable[[Any], Any],
+                  cache_params: Optional[Dict[str, Any]] = None) -> Any:
+        """
+        GET a JSON resource through the response cache.
+
+        Cached responses are revalidated with If-None-Match/If-Modified-Since;
+        on 304 the previously parsed value is returned without decoding the
+        body again. A 304 with nothing cached to reuse (e.g. from a caching
+        proxy) is answered by fetching the resource again without validators.
+        Parsed values are shared and must not be mutated. cache_params, if
+        given, replace params in the cache key.
+        """
+        key = self.cache.make_key(url, cache_params or params)
+        entry = self.cache.get(key)
+
+        response = self.session.get(
+            url,
+            params=params,
+            headers=self.cache.conditional_headers(entry),
+            timeout=self.timeout
+        )
+
+        if response.status_code == 304:
+            if entry is not None:
+                self.cache.record_hit(key)
+                logger.debug(f"Not modified, reusing cached response for {key}")
+                return entry.value
+
+            logger.warning(f"Got 304 without a cached response for {key}, fetching it again")
+            response = self.session.get(
+                url,
+                params=params,
+                headers={'Cache-Control': 'no-cache'},
+                timeout=self.timeout
+            )
+            if response.status_code == 304:
+                raise requests.HTTPError(f"304 Not Modified without a cached response for {url}", response=response)
+
+        self.cache.record_miss()
+        response.raise_for_status()
+        value = parse(response.json())
+
+        if value is not None:
+            self.cache.store(
+                key,
+                value,
+                etag=response.headers.get('ETag'),
+                last_modified=response.headers.get('Last-Modified')
+            )
+        return value
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return location planning and response cache stats"""
+        return {
+            'mode': self.mode,
+            'plan': self.last_plan_stats,
+            'cache': self.cache.stats()
+        }
+
+    def _build_warning(self, props: Dict[str, Any], location: Dict[str, Any],
+                       geometry: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Convert Geosphere warning properties into the internal warning format"""
+        raw_info = props.get('rawinfo') or props
+
+        try:
+            start_time = int(raw_info.get('start', 0))
+            end_time = int(raw_info.get('end', 0))
+
+            processed_warning = {
+                'warning_id': f"w{props.get('warnid', '')}c{props.get('chgid', '')}v{props.get('verlaufid', '')}",
+                'type': self._convert_warning_type(raw_info.get('wtype')),
+                'severity': self._convert_severity(raw_info.get('wlevel')),
+                'start_time': datetime.fromtimestamp(start_time, tz=timezone.utc),
+                'end_time': datetime.fromtimestamp(end_time, tz=timezone.utc),
+                'description': props.get('text', ''),
+                'impact': props.get('auswirkungen', ''),
+                'recommendations': props.get('empfehlungen', ''),
+                'location': location,
+                'raw_data': dict(raw_info, geometry=geometry) if geometry else raw_info
+            }
+
+            logger.debug(f"Processed warning: {processed_warning}")
+            return processed_warning
+
+        except (ValueError, TypeError) as e:
+            logger.error(f"Error processing warning {props.get('warnid')}: {str(e)}")
+            return None
+
     def _convert_warning_type(self, wtype: Optional[int]) -> str:
         """Convert numeric warning type to string"""
         types = {
@@ -0,0 +1,204 @@
+import logging
+import threading
+import time
+from datetime import datetime
+from threading import Condition, Lock
+from typing import Callable, Dict, Iterable, Optional, Set
+from ..config import Config
+from ..models.warning import Warning
+
+logger = logging.getLogger(__name__)
+
+class HistoryWriter:
+    """
+    Write-behind buffer for warning history records.
+
+    Records are queued in memory and a background thread writes them with
+    one unordered bulk insert once HISTORY_FLUSH_SIZE records are waiting or
+    the oldest has waited HISTORY_FLUSH_INTERVAL seconds, so the processor
+    never waits on a single history insert.
+
+    A duplicate key means the warning was already processed. If the stored
+    record carries a different calendar event, a concurrent processor got
+    there first and on_duplicate is called with our record so the extra
+    event can be removed; a retried record that had in fact been written
+    is recognised by its own event id and ignored.
+
+    A record rejected for any other reason is requeued, and dropped with an
+    error once it has failed HISTORY_WRITE_ATTEMPTS times. A flush that
+    fails as a whole (e.g. Mongo unreachable) requeues every record without
+    counting, as the records themselves are not at fault.
+    """
+
+    def __init__(self, on_duplicate: Optional[Callable[[Dict], None]] = None):
+        self.max_batch = Config.HISTORY_FLUSH_SIZE
+        self.max_delay = Config.HISTORY_FLUSH_INTERVAL
+        self.max_attempts = max(1, Config.HISTORY_WRITE_ATTEMPTS)
+        self.on_duplicate = on_duplicate
+        self.failures = {}  # (user_email, warning_id) -> failed writes so far
+        self.pending = []
+        self.oldest_at = None
+        self.running = False
+        self.flush_thread = None
+        self.stats = {'queued': 0, 'written': 0, 'duplicates': 0, 'conflicts': 0, 'failed_flushes': 0, 'dropped': 0}
+        self._condition = Condition()
+        self._flush_lock = Lock()
+
+    def add(self, user_email: str, warning_id: str, calendar_event_id: str):
+        """Queue a history record; it is written by the next flush"""
+        record = {
+            'user_email': user_email,
+            'warning_id': warning_id,
+            'calendar_event_id': calendar_event_id,
+            'processed_at': datetime.utcnow()
+        }
+        with self._condition:
+            self.pending.append(record)
+            self.stats['queued'] += 1
+            if self.oldest_at is None:
+                self.oldest_at = time.monotonic()
+            due = self._flush_due()
+            if due:
+                self._condition.notify()
+
+        if due and not self.running:
+            # No background thread: keep the thresholds by flushing inline
+            self.flush()
+
+    def pending_ids(self, user_emails: Iterable[str]) -> Dict[str, Set[str]]:
+        """Return queued, not yet written warning ids per user"""
+        user_emails = set(user_emails)
+        pending = {}
+        with self._condition:
+            for record in self.pending:
+                if record['user_email'] in user_emails:
+                    pending.setdefault(record['user_email'], set()).add(record['warning_id'])
+        return pending
+
+    def start(self):
+        """Start the background flush thread"""
+        with self._condition:
+            if self.flush_thread and self.flush_thread.is_alive():
+                return
+            self.running = True
+            self.flush_thread = threading.Thread(target=self._flush_loop)
+            self.flush_thread.daemon = True
+            self.flush_thread.start()
+            logger.info("History writer started")
+
+    def stop(self):
+        """Stop the background thread and write everything still queued"""
+        with self._condition:
+            self.running = False
+            self._condition.notify()
+        if self.flush_thread:
+            self.flush_thread.join(timeout=30)
+            self.flush_thread = None
+        self.flush()
+        logger.info("History writer stopped")
+
+    def flush(self):
+        """Write all queued records now"""
+        with self._flush_lock:
+            with self._condition:
+                batch = self.pending
+                self.pending = []
+                self.oldest_at = None
+            if not batch:
+                return
+
+            try:
+                duplicates, failed = Warning.mark_processed_many(batch)
+            except Exception as e:
+                logger.error(f"Error flushing {len(batch)} history records: {str(e)}")
+                self.stats['failed_flushes'] += 1
+                self._requeue(batch)
+                return
+
+            if failed or self.failures:
+                self._retry_failed(batch, failed)
+            self.stats['written'] += len(batch) - len(duplicates) - len(failed)
+            self.stats['duplicates'] += len(duplicates)
+            self._handle_duplicates(duplicates)
+            logger.debug(f"Flushed {len(batch)} history records ({len(duplicates)} duplicates, {len(failed)} failed)")
+
+    def get_stats(self):
+        with self._condition:
+            return dict(self.stats, pending=len(self.pending))
+
+    def _flush_loop(self):
+        while True:
+            with self._condition:
+                while self.running and not self._flush_due():
+                    timeout = None
+                    if self.oldest_at is not None:
+                        timeout = max(self.oldest_at + self.max_delay - time.monotonic(), 0)
+                    self._condition.wait(timeout)
+                if not self.running:
+                    return
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error in history writer loop: {str(e)}")
+                time.sleep(self.max_delay)
+
+    def _flush_due(self):
+        if not self.pending:
+            return False
+        return len(self.pending) >= self.max_batch or time.monotonic() - self.oldest_at >= self.max_delay
+
+    def _retry_failed(self, batch, failed):
+        """Requeue the failed records of a flushed batch, dropping those out of attempts"""
+        failed_keys = {(record['user_email'], record['warning_id']) for record in failed}
+        for record in batch:
+            key = (record['user_email'], record['warning_id'])
+            if key not in failed_keys:
+                self.failures.pop(key, None)
+
+        retry = []
+        for record in failed:
+            key = (record['user_email'], record['warning_id'])
+            self.failures[key] = self.failures.get(key, 0) + 1
+            if self.failures[key] < self.max_attempts:
+                retry.append(record)
+                continue
+            del self.failures[key]
+            self.stats['dropped'] += 1
+            logger.error(
+                f"Dropping history record for warning {record['warning_id']} of user {record['user_email']} "
+                f"after {self.max_attempts} failed writes"
+            )
+        if retry:
+            self._requeue(retry)
+
+    def _requeue(self, records):
+        with self._condition:
+            self.pending[:0] = records
+            if self.oldest_at is None:
+                self.oldest_at = time.monotonic()
+
+    def _handle_duplicates(self, duplicates):
+        by_user = {}
+        for record in duplicates:
+            by_user.setdefault(record['user_email'], []).append(record)
+
+        for user_email, records in by_user.items():
+            try:
+                stored = {
+                    existing['warning_id']: existing.get('calendar_event_id')
+                    for existing in Warning.find_history(user_email, [record['warning_id'] for record in records])
+                }
+            except Exception as e:
+                logger.error(f"Error checking duplicate history for user {user_email}: {str(e)}")
+                continue
+
+            for record in records:
+                if stored.get(record['warning_id']) == record['calendar_event_id']:
+                    continue
+                self.stats['conflicts'] += 1
+                logger.info(f"Warning {record['warning_id']} was already processed for user {user_email}")
+                if self.on_duplicate:
+                    try:
+                        self.on_duplicate(record)
+                    except Exception as e:
+                        logger.error(f"Error handling duplicate warning {record['warning_id']}: {str(e)}")
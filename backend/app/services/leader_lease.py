@@ -0,0 +1,143 @@
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Optional
+from ..config import Config
+from ..models.lease import Lease
+
+logger = logging.getLogger(__name__)
+
+def holder_id() -> str:
+    """Identity of this process as a lease holder; differs between forked workers"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+class LeaderLease:
+    """
+    Mongo-backed leader election for one kind of background work.
+
+    Every process (gunicorn worker or replica) runs a heartbeat thread that
+    renews the lease every LEADER_LEASE_RENEW_INTERVAL seconds while it is
+    the holder, and tries to take it over otherwise. A dead holder stops
+    renewing, so another process takes over at most LEADER_LEASE_TTL plus
+    one renew interval later; a holder that stops cleanly releases the
+    lease for an immediate handover.
+
+    Leadership is judged locally against a monotonic deadline measured from
+    before the last successful renewal, so a holder that cannot reach Mongo
+    stops working before anyone else may take over. Callers should also
+    check is_current() before a batch of side effects: it compares the
+    fencing token against Mongo and fails once another process has taken
+    the lease.
+    """
+
+    def __init__(self, name: str, ttl: float = None, renew_interval: float = None):
+        self.name = name
+        self.ttl = ttl or Config.LEADER_LEASE_TTL
+        self.renew_interval = renew_interval or Config.LEADER_LEASE_RENEW_INTERVAL
+        if self.renew_interval >= self.ttl:
+            raise ValueError(f"Lease {name}: renew interval must be shorter than the TTL")
+        self.holder = holder_id()
+        self.token = None
+        self.valid_until = 0.0
+        self.running = False
+        self.heartbeat_thread = None
+        self.stats = {'acquired': 0, 'lost': 0, 'renew_errors': 0}
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+
+    def is_leader(self) -> bool:
+        """Whether this process holds the lease, by its own clock"""
+        with self._lock:
+            return self.token is not None and time.monotonic() < self.valid_until
+
+    def current_token(self) -> Optional[int]:
+        """Fencing token of the lease if held, else None"""
+        with self._lock:
+            if self.token is not None and time.monotonic() < self.valid_until:
+                return self.token
+            return None
+
+    def is_current(self) -> bool:
+        """Check with Mongo that this process still holds the lease"""
+        token = self.current_token()
+        if token is None:
+            return False
+        try:
+            return Lease.is_current(self.name, token)
+        except Exception as e:
+            logger.error(f"Error checking lease {self.name}: {str(e)}")
+            return False
+
+    def start(self):
+        """Start the heartbeat thread"""
+        with self._lock:
+            if self.heartbeat_thread and self.heartbeat_thread.is_alive():
+                return
+            if self.token is None:
+                # Created before a fork (gunicorn --preload): take this process's own identity
+                self.holder = holder_id()
+            self.running = True
+            self._stop_event.clear()
+            self.heartbeat_thread = threading.Thread(target=self._heartbeat_loop)
+            self.heartbeat_thread.daemon = True
+            self.heartbeat_thread.start()
+            logger.info(f"Lease {self.name} heartbeat started for {self.holder}")
+
+    def stop(self):
+        """Stop the heartbeat and release the lease if held"""
+        self.running = False
+        self._stop_event.set()
+        if self.heartbeat_thread:
+            self.heartbeat_thread.join(timeout=self.renew_interval + 5)
+            self.heartbeat_thread = None
+
+        with self._lock:
+            token = self.token
+            self.token = None
+            self.valid_until = 0.0
+        if token is not None:
+            try:
+                Lease.release(self.name, self.holder, token)
+                logger.info(f"Lease {self.name} released by {self.holder}")
+            except Exception as e:
+                logger.error(f"Error releasing lease {self.name}: {str(e)}")
+
+    def renew(self):
+        """Renew or try to acquire the lease once"""
+        started_at = time.monotonic()
+        try:
+            token = Lease.acquire(self.name, self.holder, self.ttl, self.token)
+        except Exception as e:
+            # Keep the current deadline; leadership lapses by itself if Mongo stays away
+            logger.error(f"Error renewing lease {self.name}: {str(e)}")
+            self.stats['renew_errors'] += 1
+            return
+
+        with self._lock:
+            if token is None:
+                if self.token is not None:
+                    logger.warning(f"Lease {self.name} lost by {self.holder}")
+                    self.stats['lost'] += 1
+                self.token = None
+                self.valid_until = 0.0
+                return
+
+            if token != self.token:
+                logger.info(f"Lease {self.name} held by {self.holder} with token {token}")
+                self.stats['acquired'] += 1
+            self.token = token
+            self.valid_until = started_at + self.ttl
+
+    def get_stats(self):
+        with self._lock:
+            leader = self.token is not None and time.monotonic() < self.valid_until
+            return dict(self.stats, name=self.name, holder=self.holder, leader=leader,
+                        token=self.token if leader else None)
+
+    def _heartbeat_loop(self):
+        while self.running:
+            self.renew()
+            self._stop_event.wait(self.renew_interval)
@@ -0,0 +1,182 @@
+import logging
+import time
+from datetime import datetime, timedelta
+from threading import RLock
+from typing import Dict, Iterator, List, Set, Tuple
+import numpy as np
+import shapely
+from shapely import STRtree
+from ..config import Config
+from ..models.location_subscription import LocationSubscription
+from ..models.user import User
+from ..utils.geo import relevance_mask
+
+logger = logging.getLogger(__name__)
+
+class LocationIndex:
+    """
+    In-memory mirror of the location_subscriptions inverted index.
+
+    The mirror is refreshed incrementally from the cells whose updated_at
+    moved since the last sync, and fully every LOCATION_INDEX_FULL_RELOAD
+    seconds. Given a WarningMatcher it returns only the users whose cells a
+    warning can reach, so a cycle never touches users far from any warning.
+    """
+
+    # Overlap between incremental syncs, to absorb clock skew between writers
+    SYNC_SLACK = timedelta(seconds=30)
+
+    def __init__(self):
+        self.grid_degrees = Config.LOCATION_GRID_DEGREES
+        self.full_reload_interval = Config.LOCATION_INDEX_FULL_RELOAD
+        self.cells = {}  # cell id -> {'lat', 'lon', 'subscribers': [...]}
+        self.last_sync = None
+        self.last_full_reload = 0.0
+        self._tree = None
+        self._tree_ids = []
+        # Refreshed and read by both the leader and the shard worker thread
+        self._lock = RLock()
+
+    def __len__(self):
+        return len(self.cells)
+
+    def refresh(self):
+        """Bring the mirror up to date with the collection"""
+        with self._lock:
+            started_at = datetime.utcnow()
+            full = self.last_sync is None or time.monotonic() - self.last_full_reload >= self.full_reload_interval
+
+            if full and LocationSubscription.is_empty():
+                LocationSubscription.backfill(User.iter_active(require_tokens=False))
+
+            cells = {} if full else self.cells
+            since = None if full else self.last_sync - self.SYNC_SLACK
+            changed = 0
+            for doc in LocationSubscription.find_changed(since):
+                subscribers = doc.get('subscribers') or []
+                if subscribers:
+                    cells[doc['_id']] = {'lat': doc['lat'], 'lon': doc['lon'], 'subscribers': subscribers}
+                else:
+                    cells.pop(doc['_id'], None)
+                changed += 1
+
+            self.cells = cells
+            self.last_sync = started_at
+            if full:
+                self.last_full_reload = time.monotonic()
+            if full or changed:
+                self._tree = None
+            logger.info(f"Location index {'reloaded' if full else 'refreshed'}: {changed} cells read, {len(cells)} cells")
+
+    def iter_locations(self) -> Iterator[Dict]:
+        """Yield the coordinates of every subscribed location"""
+        with self._lock:
+            cells = list(self.cells.values())
+        for cell in cells:
+            for subscriber in cell['subscribers']:
+                yield {'lat': subscriber['lat'], 'lon': subscriber['lon']}
+
+    def subscriptions(self) -> Set[Tuple[str, str, float, float]]:
+        """Return (cell id, email, lat, lon) for every subscribed location"""
+        with self._lock:
+            return {
+                (cell_id, subscriber['email'], subscriber['lat'], subscriber['lon'])
+                for cell_id, cell in self.cells.items()
+                for subscriber in cell['subscribers']
+            }
+
+    def locations_in_cells(self, cell_ids) -> List[Dict]:
+        """Return the coordinates of every location subscribed in the given cells"""
+        locations = []
+        with self._lock:
+            for cell_id in cell_ids:
+                cell = self.cells.get(cell_id)
+                if not cell:
+                    continue
+                for subscriber in cell['subscribers']:
+                    locations.append({'lat': subscriber['lat'], 'lon': subscriber['lon']})
+        return locations
+
+    def affected_emails(self, matcher) -> Set[str]:
+        """
+        Return the users with a location in a cell that one of the matcher's
+        warnings can reach. This is a superset of the exact matches; callers
+        still run the matcher on these users.
+        """
+        with self._lock:
+            # A location is at most half a cell diagonal from its cell centre
+            cell_ids = set()
+            for warning_cells in self.cells_by_warning(matcher, margin_degrees=self.grid_degrees).values():
+                cell_ids.update(warning_cells)
+
+            emails = set()
+            for cell_id in cell_ids:
+                cell = self.cells.get(cell_id)
+                if cell:
+                    emails.update(subscriber['email'] for subscriber in cell['subscribers'])
+            return emails
+
+    def cells_by_warning(self, matcher, margin_degrees: float = 0.0) -> Dict[str, Set[str]]:
+        """
+        Map each of the matcher's warnings to the indexed cells it reaches.
+
+        Polygon and radius warnings reach a cell if its centre lies within
+        their (radius-buffered) area, widened by margin_degrees; warnings
+        fanned out to user coordinates reach those coordinates' cells and
+        the cells within the matcher's point tolerance, widened likewise.
+        """
+        reach = {}
+        with self._lock:
+            self._add_point_reach(matcher, margin_degrees, reach)
+            self._add_area_reach(matcher, margin_degrees, reach)
+        return reach
+
+    def _add_point_reach(self, matcher, margin_degrees, reach):
+        for (lat, lon), warnings in matcher.point_warnings.items():
+            cell_id = LocationSubscription.cell_id(lat, lon)
+            for warning in warnings:
+                reach.setdefault(warning['warning_id'], set()).add(cell_id)
+
+        tree = self._get_tree()
+        if tree is not None and matcher.point_tree is not None:
+            key_indices, cell_indices = tree.query(
+                matcher.point_tree.geometries,
+                predicate='dwithin',
+                distance=matcher.point_search_degrees + margin_degrees
+            )
+            for key_index, cell_index in zip(key_indices.tolist(), cell_indices.tolist()):
+                for warning in matcher.point_warnings[matcher.point_keys[key_index]]:
+                    reach.setdefault(warning['warning_id'], set()).add(self._tree_ids[cell_index])
+
+    def _add_area_reach(self, matcher, margin_degrees, reach):
+        tree = self._get_tree()
+        if tree is not None and matcher.tree is not None:
+            if margin_degrees > 0:
+                pairs = tree.query(matcher.tree.geometries, predicate='dwithin', distance=margin_degrees)
+            else:
+                pairs = tree.query(matcher.tree.geometries, predicate='contains')
+            for warning_index, cell_index in zip(*(indices.tolist() for indices in pairs)):
+                warning_id = matcher.polygon_warnings[warning_index]['warning_id']
+                reach.setdefault(warning_id, set()).add(self._tree_ids[cell_index])
+
+        if tree is not None and matcher.radius_warnings:
+            cells = [self.cells[cell_id] for cell_id in self._tree_ids]
+            mask = relevance_mask(
+                [cell['lat'] for cell in cells],
+                [cell['lon'] for cell in cells],
+                [warning['location']['lat'] for warning in matcher.radius_warnings],
+                [warning['location']['lon'] for warning in matcher.radius_warnings],
+                matcher.radius_km + margin_degrees * 111.32
+            )
+            for cell_index, warning_index in zip(*(indices.tolist() for indices in np.nonzero(mask))):
+                warning_id = matcher.radius_warnings[warning_index]['warning_id']
+                reach.setdefault(warning_id, set()).add(self._tree_ids[cell_index])
+
+    def _get_tree(self):
+        if self._tree is None and self.cells:
+            self._tree_ids = list(self.cells)
+            self._tree = STRtree(shapely.points(
+                [self.cells[cell_id]['lon'] for cell_id in self._tree_ids],
+                [self.cells[cell_id]['lat'] for cell_id in self._tree_ids]
+            ))
+        return self._tree
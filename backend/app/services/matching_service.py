@@ -0,0 +1,135 @@
+import logging
+import math
+from typing import Any, Dict, Iterable, List
+import numpy as np
+import shapely
+from shapely import STRtree
+from ..config import Config
+from ..utils.geo import distance_km, geometry_cache, relevance_mask
+
+logger = logging.getLogger(__name__)
+
+class WarningMatcher:
+    """
+    Bulk matcher between user locations and one cycle's warnings.
+
+    Warnings that carry a polygon are indexed in an STRtree, buffered by
+    WARNING_RADIUS_KM, and all user points are queried against it in a
+    single call. Warnings without geometry match the user locations they
+    were fetched for (their fanned-out 'locations'), and any location within
+    POINT_MATCH_TOLERANCE_KM of one, so coordinates that drifted slightly
+    (rounding, re-geocoding) still match. Warnings that only carry a point
+    fall back to the vectorised radius check.
+    """
+
+    def __init__(self, warnings: List[Dict[str, Any]], radius_km: float = None, point_tolerance_km: float = None):
+        self.radius_km = Config.WARNING_RADIUS_KM if radius_km is None else radius_km
+        self.point_tolerance_km = Config.POINT_MATCH_TOLERANCE_KM if point_tolerance_km is None else point_tolerance_km
+        self.polygon_warnings = []
+        self.point_warnings = {}
+        self.radius_warnings = []
+
+        geometries = []
+        for warning in warnings:
+            geometry = (warning.get('raw_data') or {}).get('geometry')
+            polygon = None
+            if geometry and geometry.get('coordinates'):
+                try:
+                    polygon = geometry_cache.get(warning.get('warning_id'), geometry, self.radius_km)
+                except Exception as e:
+                    logger.error(f"Error building geometry for warning {warning.get('warning_id')}: {str(e)}")
+
+            if polygon is not None:
+                geometries.append(polygon)
+                self.polygon_warnings.append(warning)
+                continue
+
+            if warning.get('locations'):
+                for loc in warning['locations']:
+                    self.point_warnings.setdefault((loc['lat'], loc['lon']), []).append(warning)
+            elif warning.get('location', {}).get('lat') is not None:
+                self.radius_warnings.append(warning)
+
+        self.tree = STRtree(geometries) if geometries else None
+
+        # Fetched coordinates of the point warnings, indexed for the tolerance search
+        self.point_keys = list(self.point_warnings)
+        self.point_lats = np.asarray([lat for lat, _ in self.point_keys], dtype=float)
+        self.point_lons = np.asarray([lon for _, lon in self.point_keys], dtype=float)
+        self.point_tree = STRtree(shapely.points(self.point_lons, self.point_lats)) if self.point_keys else None
+        # A degree of longitude shrinks with latitude, so the search box in degrees covers
+        # the tolerance a degree poleward of the northernmost point; matches are checked in km
+        max_lat = float(np.abs(self.point_lats).max()) + 1.0 if self.point_keys else 0.0
+        self.point_search_degrees = self.point_tolerance_km / (111.32 * max(math.cos(math.radians(min(max_lat, 90.0))), 0.01))
+        logger.debug(
+            f"Built warning matcher: {len(self.polygon_warnings)} polygon warnings, "
+            f"{len(self.point_warnings)} warning points, {len(self.radius_warnings)} radius warnings"
+        )
+
+    def match(self, users: Iterable[Any]) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Match every location of the given users against the warnings.
+
+        Args:
+            users: Objects with email and locations attributes
+
+        Returns:
+            dict: User email -> list of relevant warnings (each warning once)
+        """
+        emails = []
+        lats = []
+        lons = []
+        matches = {}
+
+        for user in users:
+            for loc in user.locations:
+                lat = loc.get('lat')
+                lon = loc.get('lon')
+                if lat is None or lon is None:
+                    continue
+
+                emails.append(user.email)
+                lats.append(float(lat))
+                lons.append(float(lon))
+
+        if not emails:
+            return {}
+        points = shapely.points(np.asarray(lons), np.asarray(lats))
+
+        if self.point_tree is not None:
+            self._match_points(points, np.asarray(lats), np.asarray(lons), emails, matches)
+
+        if self.tree is not None:
+            point_indices, warning_indices = self.tree.query(points, predicate='intersects')
+            for point_index, warning_index in zip(point_indices.tolist(), warning_indices.tolist()):
+                self._add_match(matches, emails[point_index], self.polygon_warnings[warning_index])
+
+        if self.radius_warnings:
+            mask = relevance_mask(
+                lats,
+                lons,
+                [warning['location']['lat'] for warning in self.radius_warnings],
+                [warning['location']['lon'] for warning in self.radius_warnings],
+                self.radius_km
+            )
+            for point_index, warning_index in zip(*np.nonzero(mask)):
+                self._add_match(matches, emails[point_index], self.radius_warnings[warning_index])
+
+        return {email: list(warnings.values()) for email, warnings in matches.items()}
+
+    def _match_points(self, points, lats, lons, emails, matches):
+        """Match locations within point_tolerance_km of a point warning's coordinates"""
+        point_indices, key_indices = self.point_tree.query(points, predicate='dwithin', distance=self.point_search_degrees)
+        if not point_indices.size:
+            return
+
+        distances = distance_km(lats[point_indices], lons[point_indices],
+                                self.point_lats[key_indices], self.point_lons[key_indices])
+        within = distances <= self.point_tolerance_km
+        for point_index, key_index in zip(point_indices[within].tolist(), key_indices[within].tolist()):
+            for warning in self.point_warnings[self.point_keys[key_index]]:
+                self._add_match(matches, emails[point_index], warning)
+
+    @staticmethod
+    def _add_match(matches, email, warning):
+        matches.setdefault(email, {}).setdefault(warning['warning_id'], warning)
@@ -0,0 +1,205 @@
+import logging
+import math
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from typing import List, Optional
+from ..config import Config
+from ..models.lease import Lease
+from .leader_lease import holder_id
+
+logger = logging.getLogger(__name__)
+
+class ShardCoordinator:
+    """
+    Spreads WARNING_SHARDS user shards over all live worker processes.
+
+    Users are hash-partitioned by email (CRC32, so every process agrees).
+    Each process keeps a membership lease and holds a share of the shard
+    leases; on every heartbeat it renews what it holds, then rebalances
+    towards ceil(shards / live members): surplus idle shards are released
+    and missing ones taken from the free or expired leases. When a worker
+    joins, the others shed shards on their next heartbeat; when one dies,
+    its shard leases expire and are picked up within the lease TTL.
+
+    Each shard lease carries its own fencing token (see Lease), used to
+    fence the shard's checkpoints.
+    """
+
+    PREFIX = 'warning-shard-'
+    MEMBER_PREFIX = 'warning-shard-member:'
+
+    def __init__(self, shards: int = None, ttl: float = None, renew_interval: float = None):
+        self.shard_count = shards or Config.WARNING_SHARDS
+        self.ttl = ttl or Config.LEADER_LEASE_TTL
+        self.renew_interval = renew_interval or Config.LEADER_LEASE_RENEW_INTERVAL
+        if self.renew_interval >= self.ttl:
+            raise ValueError("Shard lease renew interval must be shorter than the TTL")
+        self.holder = holder_id()
+        self.member_token = None
+        self.held = {}  # shard -> (token, monotonic deadline)
+        self.busy = set()
+        self.members = 1
+        self.running = False
+        self.heartbeat_thread = None
+        self.stats = {'acquired': 0, 'released': 0, 'lost': 0, 'renew_errors': 0}
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+
+    def shard_of(self, email: str) -> int:
+        return zlib.crc32(email.encode('utf-8')) % self.shard_count
+
+    def held_shards(self) -> List[int]:
+        """Shards this process holds, by its own clock"""
+        now = time.monotonic()
+        with self._lock:
+            return sorted(shard for shard, (_, deadline) in self.held.items() if now < deadline)
+
+    def token(self, shard: int) -> Optional[int]:
+        with self._lock:
+            token, deadline = self.held.get(shard, (None, 0.0))
+            return token if time.monotonic() < deadline else None
+
+    def is_current(self, shard: int) -> bool:
+        """Check with Mongo that this process still holds the shard"""
+        token = self.token(shard)
+        if token is None:
+            return False
+        try:
+            return Lease.is_current(self._name(shard), token)
+        except Exception as e:
+            logger.error(f"Error checking lease of shard {shard}: {str(e)}")
+            return False
+
+    @contextmanager
+    def working(self, shard: int):
+        """Keep the shard from being released by rebalancing while it is processed"""
+        with self._lock:
+            self.busy.add(shard)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.busy.discard(shard)
+
+    def start(self):
+        """Start the heartbeat thread"""
+        with self._lock:
+            if self.heartbeat_thread and self.heartbeat_thread.is_alive():
+                return
+            if not self.held and self.member_token is None:
+                # Created before a fork (gunicorn --preload): take this process's own identity
+                self.holder = holder_id()
+            self.running = True
+            self._stop_event.clear()
+            self.heartbeat_thread = threading.Thread(target=self._heartbeat_loop)
+            self.heartbeat_thread.daemon = True
+            self.heartbeat_thread.start()
+            logger.info(f"Shard coordinator started for {self.holder} ({self.shard_count} shards)")
+
+    def stop(self):
+        """Stop the heartbeat and release every lease held"""
+        self.running = False
+        self._stop_event.set()
+        if self.heartbeat_thread:
+            self.heartbeat_thread.join(timeout=self.renew_interval + 5)
+            self.heartbeat_thread = None
+
+        with self._lock:
+            held = {shard: token for shard, (token, _) in self.held.items()}
+            self.held = {}
+            member_token = self.member_token
+            self.member_token = None
+        try:
+            for shard, token in held.items():
+                Lease.release(self._name(shard), self.holder, token)
+            if member_token is not None:
+                Lease.release(self._member_name(), self.holder, member_token)
+            logger.info(f"Shard coordinator stopped for {self.holder}, released shards {sorted(held)}")
+        except Exception as e:
+            logger.error(f"Error releasing shard leases: {str(e)}")
+
+    def rebalance(self):
+        """Renew membership and held shards, then move towards this process's fair share"""
+        started_at = time.monotonic()
+        try:
+            self.member_token = Lease.acquire(self._member_name(), self.holder, self.ttl, self.member_token)
+            for shard in list(self.held):
+                self._renew(shard, started_at)
+
+            live = Lease.find_live(self.PREFIX)
+            taken = set()
+            members = 0
+            for lease in live:
+                suffix = lease['_id'][len(self.PREFIX):]
+                if lease['_id'].startswith(self.MEMBER_PREFIX):
+                    members += 1
+                elif suffix.isdigit():
+                    taken.add(int(suffix))
+            self.members = max(members, 1)
+            target = math.ceil(self.shard_count / self.members)
+
+            # Shed idle surplus first so joining workers find free shards
+            with self._lock:
+                surplus = [shard for shard in sorted(self.held, reverse=True) if shard not in self.busy]
+                surplus = surplus[:max(len(self.held) - target, 0)]
+            for shard in surplus:
+                self._release(shard)
+
+            # Start at a per-process offset so workers don't all race for the same shard
+            offset = zlib.crc32(self.holder.encode('utf-8')) % self.shard_count
+            for step in range(self.shard_count):
+                if len(self.held) >= target:
+                    break
+                shard = (offset + step) % self.shard_count
+                if shard in taken or shard in self.held:
+                    continue
+                token = Lease.acquire(self._name(shard), self.holder, self.ttl)
+                if token is not None:
+                    with self._lock:
+                        self.held[shard] = (token, started_at + self.ttl)
+                    self.stats['acquired'] += 1
+                    logger.info(f"Shard {shard} acquired by {self.holder} with token {token}")
+        except Exception as e:
+            # Held shards keep their deadlines and lapse by themselves if Mongo stays away
+            logger.error(f"Error rebalancing shards: {str(e)}")
+            self.stats['renew_errors'] += 1
+
+    def get_stats(self):
+        return dict(self.stats, holder=self.holder, members=self.members, shards=self.shard_count,
+                    held=self.held_shards(), busy=sorted(self.busy))
+
+    def _renew(self, shard, started_at):
+        with self._lock:
+            token = self.held[shard][0]
+        renewed = Lease.acquire(self._name(shard), self.holder, self.ttl, token)
+        with self._lock:
+            if renewed == token:
+                self.held[shard] = (token, started_at + self.ttl)
+            else:
+                # Lost, or expired and taken back with a new token: either way the old token is fenced
+                logger.warning(f"Lease of shard {shard} lost by {self.holder}")
+                self.stats['lost'] += 1
+                if renewed is None:
+                    self.held.pop(shard, None)
+                else:
+                    self.held[shard] = (renewed, started_at + self.ttl)
+
+    def _release(self, shard):
+        with self._lock:
+            token, _ = self.held.pop(shard)
+        Lease.release(self._name(shard), self.holder, token)
+        self.stats['released'] += 1
+        logger.info(f"Shard {shard} released by {self.holder} for rebalancing")
+
+    def _name(self, shard):
+        return f"{self.PREFIX}{shard}"
+
+    def _member_name(self):
+        return f"{self.MEMBER_PREFIX}{self.holder}"
+
+    def _heartbeat_loop(self):
+        while self.running:
+            self.rebalance()
+            self._stop_event.wait(self.renew_interval)
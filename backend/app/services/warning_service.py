@@ -1,15 +1,27 @@
+import atexit
 import logging
 import threading
+from bisect import bisect_left
+from itertools import islice
 import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime, timedelta, timezone
 from threading import Lock
 from google_auth_oauthlib.flow import Flow
 
 from ..models.user import User
 from ..models.warning import Warning
+from ..models.processing_cycle import ProcessingCycle
+from ..models.location_subscription import LocationSubscription
 from .geosphere_service import GeosphereService
 from .calendar_service import GoogleCalendarService
+from .matching_service import WarningMatcher
+from .location_index import LocationIndex
+from .history_writer import HistoryWriter
+from .leader_lease import LeaderLease
+from .shard_coordinator import ShardCoordinator
 from ..config import Config
+from ..utils.geo import geometry_cache
 
 logger = logging.getLogger(__name__)
 
@@ -29,9 +41,38 @@ class WarningService:
             return
             
         self.geosphere_service = GeosphereService()
+        self.location_index = LocationIndex()
+        self.history_writer = HistoryWriter(on_duplicate=self._delete_duplicate_event)
+        # Only the holder of this lease runs cycles, across all workers and replicas
+        self.lease = LeaderLease('warning-processor')
+        self.lease_token = None
+        # Users are processed per shard by every process holding shard leases
+        self.shards = ShardCoordinator()
+        self.shard_stats = {}  # shard -> stats of the last cycle completed here
+        self._cycle_matcher = None
+        # Per-user work of a batch runs on this pool (created on first use)
+        self.user_workers = max(1, Config.USER_PROCESSING_WORKERS)
+        self.user_timeout = Config.USER_PROCESSING_TIMEOUT
+        self._user_executor = None
+        # Timed-out users whose threads still hold a pool slot
+        self._abandoned = set()
+        self._abandoned_lock = Lock()
+        # shard -> (cycle id, {email: times left unfinished}) for the cycle in progress
+        self._unfinished_attempts = {}
+        # Queued history records must reach Mongo even if the process exits mid-cycle;
+        # atexit runs in reverse order, so they are flushed before the leases are released
+        atexit.register(self.lease.stop)
+        atexit.register(self.shards.stop)
+        atexit.register(self.history_writer.stop)
         self.running = False
         self.check_interval = Config.WARNING_CHECK_INTERVAL
         self.processor_thread = None
+        self.shard_thread = None
+        self.previous_warnings = None  # warning_id -> fingerprint of the previous cycle
+        self.previous_subscriptions = None  # LocationIndex.subscriptions() of the previous cycle
+        self.cycles_since_full_sync = 0
+        self.last_cycle_stats = {}
+        self.last_archive_at = None
         self.initialized = True
 
     def start_warning_processor(self):
@@ -46,9 +87,15 @@ class WarningService:
                 return
 
             self.running = True
+            self.history_writer.start()
+            self.lease.start()
+            self.shards.start()
             self.processor_thread = threading.Thread(target=self._warning_processor_loop)
             self.processor_thread.daemon = True
             self.processor_thread.start()
+            self.shard_thread = threading.Thread(target=self._shard_worker_loop)
+            self.shard_thread.daemon = True
+            self.shard_thread.start()
             logger.info("Warning processor started")
 
     def stop_warning_processor(self):
@@ -59,39 +106,76 @@ class WarningService:
             if self.processor_thread:
                 self.processor_thread.join(timeout=30)
                 self.processor_thread = None
+            if self.shard_thread:
+                self.shard_thread.join(timeout=30)
+                self.shard_thread = None
+            if self._user_executor:
+                self._user_executor.shutdown(wait=False, cancel_futures=True)
+                self._user_executor = None
+            self.history_writer.stop()
+            self.shards.stop()
+            self.lease.stop()
 
     def _warning_processor_loop(self):
         """Background loop to process warnings"""
         logger.info("Warning processor loop started")
         while self.running:
             try:
+                token = self.lease.current_token()
+                if token is None:
+                    # Poll at heartbeat pace so a standby takes over quickly
+                    self.lease_token = None
+                    time.sleep(self.lease.renew_interval)
+                    continue
+                if token != self.lease_token:
+                    logger.info(f"Became warning processor leader with token {token}")
+                    self._reset_cycle_state()
+                    self.lease_token = token
+
                 self.process_warnings()
+                self.archive_history_if_due()
                 time.sleep(self.check_interval)
             except Exception as e:
                 logger.error(f"Error in warning processor loop: {str(e)}")
                 time.sleep(60)  # Wait before retrying
 
+    def _shard_worker_loop(self):
+        """Background loop processing the users of the shards held by this process"""
+        logger.info("Shard worker loop started")
+        while self.running:
+            try:
+                self.process_shards()
+            except Exception as e:
+                logger.error(f"Error in shard worker loop: {str(e)}")
+            time.sleep(Config.SHARD_POLL_INTERVAL)
+
+    def _reset_cycle_state(self):
+        """Forget the previous cycle; another leader may have run cycles since"""
+        self.previous_warnings = None
+        self.previous_subscriptions = None
+        self.cycles_since_full_sync = 0
+
+    def _lease_lost(self):
+        """Check the fencing token before a batch of side effects"""
+        if self.lease.is_current():
+            return False
+        logger.warning("Warning processor lease lost, abandoning cycle")
+        self.lease_token = None
+        return True
+
     def process_warnings(self):
         """Process all warnings for all users"""
         try:
             logger.info("Starting warning processing cycle")
             
-            # Get all active users and their locations
-            users = User.get_all_active()
-            logger.info(f"Processing warnings for {len(users)} active users")
-
-            # Collect all unique locations from all users
-            all_locations = []
-            for user in users:
-                if user.locations:
-                    all_locations.extend(user.locations)
-            
-            if not all_locations:
+            # Fetch warnings for every subscribed location in the inverted index
+            self.location_index.refresh()
+            subscriptions = self.location_index.subscriptions()
+            warnings = self.geosphere_service.get_warnings(self.location_index.iter_locations())
+            if not self.geosphere_service.last_plan_stats.get('locations'):
                 logger.info("No locations to check for warnings")
                 return
 
-            # Get warnings for all locations
-            warnings = self.geosphere_service.get_warnings(all_locations)
             logger.info(f"Fetched {len(warnings)} warnings from Geosphere")
 
             current_time = datetime.now(timezone.utc)
@@ -125,27 +209,423 @@ class WarningService:
                                f"is_future={is_future_warning}, is_within_window={is_within_window}")
 
             logger.info(f"Found {len(upcoming_warnings)} upcoming warnings")
-            
-            # Process warnings for each user
-            for user in users:
+
+            delta, fingerprints = self._compute_delta(upcoming_warnings)
+            full_sync = self._is_full_sync_due()
+            warnings_to_process = upcoming_warnings if full_sync else delta['added'] + delta['changed']
+            # Locations subscribed since the last cycle may share coordinates with known
+            # ones, leaving every fingerprint unchanged; they get a cycle of their own
+            new_emails = set()
+            if not full_sync and self.previous_subscriptions is not None and upcoming_warnings:
+                new_emails = {email for _, email, _, _ in subscriptions - self.previous_subscriptions}
+            self.last_cycle_stats = {
+                'started_at': current_time.isoformat(),
+                'upcoming': len(upcoming_warnings),
+                'added': len(delta['added']),
+                'changed': len(delta['changed']),
+                'expired': len(delta['expired']),
+                'full_sync': full_sync,
+                'new_subscribers': len(new_emails),
+                'indexed_cells': len(self.location_index)
+            }
+            logger.info(
+                f"Warning delta: {len(delta['added'])} added, {len(delta['changed'])} changed, "
+                f"{len(delta['expired'])} expired, {len(new_emails)} new subscribers (full sync: {full_sync})"
+            )
+
+            if self._lease_lost():
+                self._reset_cycle_state()
+                return
+
+            # Materialise every upcoming warning with the cells it reaches, for the dashboard;
+            # shard workers read the cycle's warnings back from there, so publish nothing without it
+            matcher = WarningMatcher(upcoming_warnings)
+            try:
+                Warning.upsert_many(upcoming_warnings, self.location_index.cells_by_warning(matcher))
+            except Exception as e:
+                logger.error(f"Error materialising active warnings, abandoning cycle: {str(e)}")
+                self._reset_cycle_state()
+                return
+
+            if delta['expired']:
+                geometry_cache.evict(delta['expired'])
+
+            if not warnings_to_process and not new_emails:
+                logger.info("No warning changes since previous cycle, skipping user processing")
+                self.previous_warnings = fingerprints
+                self.previous_subscriptions = subscriptions
+                return
+
+            # Users are processed by the shard workers of all processes
+            if warnings_to_process:
+                cycle_id = ProcessingCycle.publish(
+                    [warning['warning_id'] for warning in warnings_to_process],
+                    full_sync,
+                    self.shards.shard_count
+                )
+                self.last_cycle_stats['cycle_id'] = str(cycle_id)
+                logger.info(f"Published processing cycle {cycle_id} with {len(warnings_to_process)} warnings")
+            if new_emails:
+                cycle_id = ProcessingCycle.publish(
+                    [warning['warning_id'] for warning in upcoming_warnings],
+                    False,
+                    self.shards.shard_count,
+                    emails=new_emails
+                )
+                self.last_cycle_stats['subscriber_cycle_id'] = str(cycle_id)
+                logger.info(f"Published processing cycle {cycle_id} for {len(new_emails)} new subscribers")
+            # Only now are this cycle's warnings on their way to the users
+            self.previous_warnings = fingerprints
+            self.previous_subscriptions = subscriptions
+        except Exception as e:
+            logger.error(f"Error in warning processing: {str(e)}")
+            # The next cycle is a full sync, so nothing seen here is lost
+            self._reset_cycle_state()
+
+    def process_shards(self):
+        """Process the pending cycles of every shard this process holds"""
+        for shard in self.shards.held_shards():
+            if not self.running:
+                return
+            with self.shards.working(shard):
                 try:
-                    if not user.google_tokens or not user.google_tokens.get('access_token'):
-                        logger.info(f"Skipping user {user.email} - no Google tokens")
+                    cycles, superseded = ProcessingCycle.find_pending(shard, self.shards.shard_count)
+                    token = self.shards.token(shard)
+                    # The fence only holds once we have written a checkpoint, so confirm
+                    # with Mongo before closing cycles we never touched
+                    if token is None or not self.shards.is_current(shard):
                         continue
-
-                    self._process_user_warnings(user, upcoming_warnings)
+                    if not all(ProcessingCycle.advance(cycle_id, shard, token, done=True) for cycle_id in superseded):
+                        continue
+                    for cycle in cycles:
+                        if not self._process_shard_cycle(cycle, shard, token):
+                            break
                 except Exception as e:
-                    logger.error(f"Error processing warnings for user {user.email}: {str(e)}")
+                    logger.error(f"Error processing shard {shard}: {str(e)}")
+
+    def _process_shard_cycle(self, cycle, shard, token):
+        """
+        Process one shard's users for a cycle, resuming after its checkpoint.
+
+        Users that timed out or never started are retried: the checkpoint
+        stops just before the first of them and the cycle is resumed from
+        there on the next pass. Users already handled are skipped then
+        through their history. A user left unfinished more than
+        USER_PROCESSING_RETRIES times is given up for this cycle.
+
+        Returns:
+            bool: False if the shard was lost or users were left for the next pass
+        """
+        cycle_id = cycle['_id']
+        # Stamp the checkpoint with our token before any side effect, fencing off
+        # a previous owner that has not noticed it lost the shard
+        if not ProcessingCycle.advance(cycle_id, shard, token):
+            return False
+        matcher, affected_emails = self._get_cycle_matcher(cycle)
+        checkpoint = ProcessingCycle.get_checkpoint(cycle_id, shard) or {}
+        last_email = checkpoint.get('last_email')
+        emails = sorted(
+            email for email in affected_emails
+            if self.shards.shard_of(email) == shard and (last_email is None or email > last_email)
+        )
+        if last_email:
+            logger.info(f"Resuming shard {shard} of cycle {cycle_id} after {last_email}")
+
+        stats = {
+            'users_checked': 0, 'users_processed': 0, 'users_failed': 0, 'users_timed_out': 0, 'users_skipped': 0,
+            'users_given_up': 0,
+            'queue_wait_seconds': 0.0, 'queue_wait_max_seconds': 0.0,
+            'execution_seconds': 0.0, 'execution_max_seconds': 0.0
+        }
+        for chunk_last_email, users in self._iter_active_user_batches(emails):
+            if not self.shards.is_current(shard):
+                logger.warning(f"Lease of shard {shard} lost, leaving cycle {cycle_id}")
+                return False
+
+            matches = matcher.match(users)
+            stats['users_checked'] += len(users)
+
+            # One history lookup for the whole batch instead of one per user and warning,
+            # plus whatever is still queued in the history writer
+            processed = Warning.get_processed_ids(
+                list(matches),
+                {warning['warning_id'] for warnings in matches.values() for warning in warnings}
+            )
+            for email, warning_ids in self.history_writer.pending_ids(matches).items():
+                processed.setdefault(email, set()).update(warning_ids)
+
+            tasks = [
+                (user, matches[user.email], processed.get(user.email, set()))
+                for user in users if matches.get(user.email)
+            ]
+            unfinished = self._retry_unfinished(cycle_id, shard, self._run_user_tasks(tasks, stats), stats)
+
+            # History must be written before the checkpoint moves past these users
+            self.history_writer.flush()
+            if unfinished:
+                first = min(user.email for user in unfinished)
+                index = bisect_left(emails, first)
+                resume_after = emails[index - 1] if index else last_email
+                ProcessingCycle.advance(cycle_id, shard, token, last_email=resume_after)
+                logger.warning(
+                    f"{len(unfinished)} users of shard {shard} did not finish, "
+                    f"cycle {cycle_id} resumes at {first} on the next pass"
+                )
+                return False
+            if not ProcessingCycle.advance(cycle_id, shard, token, last_email=chunk_last_email):
+                return False
+
+        if not ProcessingCycle.advance(cycle_id, shard, token, done=True):
+            return False
+        self._unfinished_attempts.pop(shard, None)
+        for key in ('queue_wait_seconds', 'queue_wait_max_seconds', 'execution_seconds', 'execution_max_seconds'):
+            stats[key] = round(stats[key], 3)
+        stats['abandoned_threads'] = self.abandoned_threads()
+        self.shard_stats[shard] = dict(stats, cycle_id=str(cycle_id), completed_at=datetime.utcnow().isoformat())
+        logger.info(
+            f"Completed shard {shard} of cycle {cycle_id}: {stats['users_checked']} users checked, "
+            f"{stats['users_processed']} with relevant warnings ({stats['users_failed']} failed, "
+            f"{stats['users_timed_out']} timed out, {stats['users_given_up']} given up), "
+            f"queue wait {stats['queue_wait_seconds']}s, execution {stats['execution_seconds']}s, "
+            f"{stats['abandoned_threads']} abandoned threads still running"
+        )
+        return True
+
+    def _retry_unfinished(self, cycle_id, shard, unfinished, stats):
+        """Count another unfinished attempt for each user; return those still to be retried"""
+        attempts_cycle, attempts = self._unfinished_attempts.get(shard, (None, {}))
+        if attempts_cycle != cycle_id:
+            attempts = {}
+            self._unfinished_attempts[shard] = (cycle_id, attempts)
+
+        retry = []
+        for user in unfinished:
+            attempts[user.email] = attempts.get(user.email, 0) + 1
+            if attempts[user.email] > Config.USER_PROCESSING_RETRIES:
+                logger.error(
+                    f"Giving up on user {user.email} in cycle {cycle_id} after "
+                    f"{attempts[user.email]} unfinished attempts"
+                )
+                stats['users_given_up'] += 1
+            else:
+                retry.append(user)
+        return retry
+
+    def _run_user_tasks(self, tasks, stats):
+        """
+        Run _process_user_warnings for (user, warnings, processed_ids) tasks,
+        concurrently on the bounded user pool unless USER_PROCESSING_WORKERS is 1.
+
+        Each user runs in isolation: a failure is logged and counted, and a
+        user still running USER_PROCESSING_TIMEOUT seconds after it started is
+        abandoned so the batch moves on. Its thread finishes in the background
+        and keeps its pool slot until then: up to CALENDAR_MAX_ATTEMPTS times
+        GOOGLE_API_TIMEOUT per batch of inserts, plus backoff. Users still
+        queued once every task could have run to its timeout, on the slots not
+        held by abandoned threads, are cancelled. Queue wait and execution time
+        are added to stats.
+
+        Returns:
+            list: Users that timed out or were never started
+        """
+        if not tasks:
+            return []
+
+        if self.user_workers == 1:
+            for user, warnings, processed_ids in tasks:
+                timing = {'submitted_at': time.monotonic()}
+                self._record_user_result(user, self._timed_user_task(timing, user, warnings, processed_ids), timing, stats)
+            return []
+
+        executor = self._get_user_executor()
+        futures = {}
+        for user, warnings, processed_ids in tasks:
+            timing = {'submitted_at': time.monotonic()}
+            futures[executor.submit(self._timed_user_task, timing, user, warnings, processed_ids)] = (user, timing)
+
+        free_workers = max(self.user_workers - self.abandoned_threads(), 1)
+        rounds = -(-len(tasks) // free_workers)
+        deadline = time.monotonic() + self.user_timeout * (rounds + 1)
+        pending = set(futures)
+        unfinished = []
+        while pending:
+            done, pending = wait(pending, timeout=min(self.user_timeout, 1.0), return_when=FIRST_COMPLETED)
+            for future in done:
+                user, timing = futures[future]
+                if future.cancelled():
+                    unfinished.append(user)
+                    stats['users_skipped'] += 1
                     continue
-                    
-            logger.info("Completed warning processing cycle")
+                self._record_user_result(user, future.result(), timing, stats)
+
+            now = time.monotonic()
+            for future in list(pending):
+                user, timing = futures[future]
+                started_at = timing.get('started_at')
+                if started_at is not None and now - started_at > self.user_timeout:
+                    logger.error(f"Processing warnings for user {user.email} timed out after {self.user_timeout}s")
+                    pending.discard(future)
+                    self._abandon(future)
+                    unfinished.append(user)
+                    stats['users_timed_out'] += 1
+                    stats['queue_wait_seconds'] += started_at - timing['submitted_at']
+                    stats['execution_seconds'] += now - started_at
+                    stats['execution_max_seconds'] = max(stats['execution_max_seconds'], now - started_at)
+                elif started_at is None and now > deadline and future.cancel():
+                    logger.error(f"Processing warnings for user {user.email} was never started, skipping")
+                    pending.discard(future)
+                    unfinished.append(user)
+                    stats['users_skipped'] += 1
+        return unfinished
+
+    def _abandon(self, future):
+        """Track a timed-out task until its thread gives the pool slot back"""
+        with self._abandoned_lock:
+            self._abandoned.add(future)
+
+        def release(done):
+            with self._abandoned_lock:
+                self._abandoned.discard(done)
+
+        # Runs at once if the task has finished in the meantime
+        future.add_done_callback(release)
+
+    def abandoned_threads(self):
+        """Number of timed-out user tasks whose threads are still running"""
+        with self._abandoned_lock:
+            return len(self._abandoned)
+
+    def _timed_user_task(self, timing, user, warnings, processed_ids):
+        """Run one user's warnings, recording when it started and finished; never raises"""
+        timing['started_at'] = time.monotonic()
+        try:
+            self._process_user_warnings(user, warnings, processed_ids)
+            return None
         except Exception as e:
-            logger.error(f"Error in warning processing: {str(e)}")
+            return e
+        finally:
+            timing['finished_at'] = time.monotonic()
+
+    @staticmethod
+    def _record_user_result(user, error, timing, stats):
+        queue_wait = timing['started_at'] - timing['submitted_at']
+        execution = timing['finished_at'] - timing['started_at']
+        stats['queue_wait_seconds'] += queue_wait
+        stats['queue_wait_max_seconds'] = max(stats['queue_wait_max_seconds'], queue_wait)
+        stats['execution_seconds'] += execution
+        stats['execution_max_seconds'] = max(stats['execution_max_seconds'], execution)
+        if error is None:
+            stats['users_processed'] += 1
+        else:
+            logger.error(f"Error processing warnings for user {user.email}: {str(error)}")
+            stats['users_failed'] += 1
+
+    def _get_user_executor(self):
+        if self._user_executor is None:
+            self._user_executor = ThreadPoolExecutor(
+                max_workers=self.user_workers,
+                thread_name_prefix='user-processing'
+            )
+        return self._user_executor
+
+    def _get_cycle_matcher(self, cycle):
+        """Build (once per cycle) the matcher and the users its warnings can reach"""
+        cached = self._cycle_matcher
+        if cached and cached[0] == cycle['_id']:
+            return cached[1], cached[2]
+
+        self.location_index.refresh()
+        warnings = Warning.find_for_processing(cycle['warning_ids'])
+        for warning in warnings:
+            # Warnings without geometry were fetched per cell; fan them out again
+            if not warning['raw_data'].get('geometry'):
+                warning['locations'] = self.location_index.locations_in_cells(warning.get('cells') or [])
+        matcher = WarningMatcher(warnings)
+        affected_emails = self.location_index.affected_emails(matcher)
+        if cycle.get('emails') is not None:
+            affected_emails &= set(cycle['emails'])
+        self._cycle_matcher = (cycle['_id'], matcher, affected_emails)
+        return matcher, affected_emails
+
+    @staticmethod
+    def _iter_active_user_batches(emails):
+        """
+        Yield the given users that are active, in lists of USER_BATCH_SIZE,
+        each with the last email of its chunk (in sorted order) for checkpoints
+        """
+        emails = iter(sorted(emails))
+        while True:
+            chunk = list(islice(emails, Config.USER_BATCH_SIZE))
+            if not chunk:
+                return
+            yield chunk[-1], list(User.iter_active(emails=chunk))
+
+    def _compute_delta(self, warnings):
+        """
+        Compare this cycle's warnings with the previous cycle's.
+
+        Warnings are keyed on their w{warnid}c{chgid}v{verlaufid} id; a new id
+        for a known warnid, or a known id whose times or affected locations
+        differ, counts as changed.
+
+        Returns:
+            tuple: (delta, fingerprints to remember once the cycle is published)
+        """
+        current = {warning['warning_id']: self._warning_fingerprint(warning) for warning in warnings}
+        previous = self.previous_warnings or {}
+        previous_warnids = {self._warnid(warning_id) for warning_id in previous}
+
+        delta = {'added': [], 'changed': [], 'expired': [
+            warning_id for warning_id in previous if warning_id not in current
+        ]}
+        for warning in warnings:
+            warning_id = warning['warning_id']
+            if warning_id in previous:
+                if previous[warning_id] != current[warning_id]:
+                    delta['changed'].append(warning)
+            elif self._warnid(warning_id) in previous_warnids:
+                delta['changed'].append(warning)
+            else:
+                delta['added'].append(warning)
 
-    def _process_user_warnings(self, user, warnings):
-        """Process warnings for a specific user"""
+        return delta, current
+
+    def _is_full_sync_due(self):
+        """Periodically process every warning so preference changes and failed events are retried"""
+        if self.cycles_since_full_sync <= 0 or self.cycles_since_full_sync >= Config.WARNING_FULL_SYNC_CYCLES:
+            self.cycles_since_full_sync = 1
+            return True
+        self.cycles_since_full_sync += 1
+        return False
+
+    @staticmethod
+    def _warnid(warning_id):
+        return warning_id.split('c', 1)[0]
+
+    @staticmethod
+    def _warning_fingerprint(warning):
+        locations = tuple(sorted(
+            (loc['lat'], loc['lon']) for loc in warning.get('locations') or [warning['location']]
+        ))
+        return hash((
+            warning.get('type'),
+            warning.get('severity'),
+            warning.get('start_time'),
+            warning.get('end_time'),
+            locations
+        ))
+
+    def _process_user_warnings(self, user, warnings, processed_ids=None):
+        """
+        Process warnings already matched to one of the user's locations.
+
+        processed_ids is the set of those warnings already in the user's
+        history; it is looked up here if not given.
+        """
         try:
-            calendar_service = GoogleCalendarService(user.email)
+            if processed_ids is None:
+                warning_ids = [warning.get('warning_id') for warning in warnings]
+                processed_ids = Warning.get_processed_ids([user.email], warning_ids).get(user.email, set())
             relevant_warnings = []
             
             # Filter warnings based on user preferences and check for duplicates
@@ -158,39 +638,92 @@ class WarningService:
                     continue
                     
                 # Skip if warning is already processed
-                if Warning.is_processed(user.email, warning_id):
+                if warning_id in processed_ids:
                     logger.debug(f"Warning {warning_id} already processed for user {user.email}")
                     continue
                     
-                # Check if warning location matches any user location
-                for user_location in user.locations:
-                    if (warning['location']['lat'] == user_location['lat'] and 
-                        warning['location']['lon'] == user_location['lon']):
-                        relevant_warnings.append(warning)
-                        break
+                relevant_warnings.append(warning)
             
             logger.info(f"Found {len(relevant_warnings)} new relevant warnings for user {user.email}")
-            logger.debug(f"Relevant warnings: {relevant_warnings}")
+            logger.debug(f"Relevant warnings: {[w['warning_id'] for w in relevant_warnings]}")
+            if not relevant_warnings:
+                return
 
-            for warning in relevant_warnings:
+            calendar_service = GoogleCalendarService(user.email)
+            if len(relevant_warnings) == 1:
+                warning = relevant_warnings[0]
                 try:
-                    # Double-check for duplicate right before creation
-                    if not Warning.is_processed(user.email, warning['warning_id']):
-                        logger.debug(f"Creating calendar event for warning: {warning['warning_id']}")
-                        event = calendar_service.create_warning_event(warning)
-                        Warning.mark_processed(user.email, warning['warning_id'], event['id'])
-                        logger.info(f"Created warning event for user {user.email}: {warning['type']}")
+                    logger.debug(f"Creating calendar event for warning: {warning['warning_id']}")
+                    event = calendar_service.create_warning_event(warning)
+                    self.history_writer.add(user.email, warning['warning_id'], event['id'])
+                    logger.info(f"Created warning event for user {user.email}: {warning['type']}")
                 except Exception as e:
                     logger.error(f"Error processing individual warning: {str(e)}", exc_info=True)
-                    continue
+                return
+
+            # Several warnings go out as batch requests; each created event is
+            # recorded in the history as soon as its response arrives
+            calendar_service.create_warning_events(
+                relevant_warnings,
+                on_created=lambda warning, event: self.history_writer.add(user.email, warning['warning_id'], event['id'])
+            )
 
         except Exception as e:
             logger.error(f"Error processing user warnings: {str(e)}", exc_info=True)
             raise
 
-    def get_user_warning_history(self, user_email, limit=50):
-        """Get warning history for user"""
-        return Warning.get_user_history(user_email, limit)
+    @staticmethod
+    def _delete_duplicate_event(record):
+        """Remove the calendar event of a warning a concurrent processor already handled"""
+        GoogleCalendarService(record['user_email']).delete_event(record['calendar_event_id'])
+
+    def archive_history_if_due(self):
+        """Archive old warning history at most once per WARNING_HISTORY_ARCHIVE_INTERVAL"""
+        if not Config.WARNING_HISTORY_ARCHIVE or not self.lease.is_leader():
+            return
+        now = time.monotonic()
+        if self.last_archive_at is not None and now - self.last_archive_at < Config.WARNING_HISTORY_ARCHIVE_INTERVAL:
+            return
+        self.last_archive_at = now
+        try:
+            Warning.archive_history()
+        except Exception as e:
+            logger.error(f"Error archiving warning history: {str(e)}")
+
+    def get_active_warnings(self, user):
+        """
+        Get the active and upcoming warnings for the user's locations.
+
+        Answered from the materialised warnings store with one indexed query
+        on the cells of the user's geocoded locations; Geosphere is never
+        called here.
+        """
+        names_by_cell = {}
+        for location in user.locations:
+            if location.get('lat') is None or location.get('lon') is None:
+                continue
+            cell_id = LocationSubscription.cell_id(location['lat'], location['lon'])
+            names_by_cell.setdefault(cell_id, []).append(location.get('name'))
+
+        warnings = []
+        for warning in Warning.find_active_for_cells(names_by_cell):
+            names = [name for cell_id in warning.pop('cells') for name in names_by_cell.get(cell_id, [])]
+            warning['id'] = warning['warning_id']
+            warning['location'] = {'area': ', '.join(sorted(set(filter(None, names))))}
+            warnings.append(warning)
+        return warnings
+
+    def get_shard_stats(self):
+        """Shard ownership of this process and its last completed cycle per shard"""
+        return {
+            'coordinator': self.shards.get_stats(),
+            'completed': dict(self.shard_stats),
+            'abandoned_threads': self.abandoned_threads()
+        }
+
+    def get_user_warning_history(self, user_email, limit=50, after=None):
+        """Get one page of warning history for user and the cursor of the next page"""
+        return Warning.get_user_history_page(user_email, limit, after)
 
     def update_user_preferences(self, user_email, preferences):
         """Update user warning preferences"""
@@ -0,0 +1,134 @@
+import csv
+import logging
+from threading import Lock
+from typing import Dict, List, Optional
+import numpy as np
+from ..config import Config
+from .geo import normalize_place_name
+
+logger = logging.getLogger(__name__)
+
+class Gazetteer:
+    """
+    Offline index of Austrian places for autocomplete and exact lookups.
+
+    Places are held in flat NumPy arrays and searched with a sorted key
+    array plus binary search (searchsorted), so a lookup never touches the
+    network and stays well under a millisecond. Names and postcodes are
+    both indexed. Because the data lives in array buffers rather than in
+    per-place Python objects, a gazetteer loaded before gunicorn forks
+    (--preload) stays shared copy-on-write between workers.
+
+    Coverage depends on the CSV. The bundled gazetteer_at.csv is a seed list
+    of the state capitals and larger towns, not the ~2,100 municipalities,
+    so most other names still go to the rate-limited geocoder. Only a file
+    with at least GAZETTEER_COMPLETE_PLACES places (e.g. the Statistik
+    Austria municipality list) counts as complete; a partial one is logged
+    at load and reported in stats().
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        names = []
+        postcodes = []
+        states = []
+        coordinates = []
+
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                try:
+                    coordinates.append((float(row['lat']), float(row['lon'])))
+                except (KeyError, TypeError, ValueError):
+                    logger.warning(f"Skipping gazetteer row with invalid coordinates: {row}")
+                    continue
+                names.append(row['name'].strip())
+                postcodes.append((row.get('postcode') or '').strip())
+                states.append((row.get('state') or '').strip())
+
+        self.names = np.array(names, dtype=str)
+        self.postcodes = np.array(postcodes, dtype=str)
+        self.states = np.array(states, dtype=str)
+        self.coordinates = np.array(coordinates, dtype=float).reshape(-1, 2)
+
+        # One index key per name and per postcode, sorted for prefix search
+        keys = [normalize_place_name(name) for name in names] + postcodes
+        rows = list(range(len(names))) * 2
+        order = sorted((key, row) for key, row in zip(keys, rows) if key)
+        self.keys = np.array([key for key, _ in order], dtype=str)
+        self.rows = np.array([row for _, row in order], dtype=np.int32)
+
+        self.complete = len(names) >= Config.GAZETTEER_COMPLETE_PLACES
+        logger.info(f"Loaded gazetteer with {len(names)} places from {path}")
+        if not self.complete:
+            logger.warning(
+                f"Gazetteer covers only {len(names)} places (complete from {Config.GAZETTEER_COMPLETE_PLACES}); "
+                f"other places are resolved by the rate-limited geocoder"
+            )
+
+    def __len__(self):
+        return len(self.names)
+
+    def stats(self) -> Dict:
+        return {'path': self.path, 'places': len(self.names), 'complete': self.complete}
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[Dict]:
+        """Return up to limit places whose name or postcode starts with prefix"""
+        key = normalize_place_name(prefix)
+        if not key:
+            return []
+
+        start = np.searchsorted(self.keys, key, side='left')
+        end = np.searchsorted(self.keys, key + '\uffff', side='left')
+
+        places = []
+        seen = set()
+        for row in self.rows[start:end]:
+            if row in seen:
+                continue
+            seen.add(row)
+            places.append(self._place(row))
+            if len(places) >= limit:
+                break
+        return places
+
+    def lookup_exact(self, name: str) -> Optional[Dict]:
+        """Return the place exactly matching a name or postcode, or None if unknown or ambiguous"""
+        key = normalize_place_name(name)
+        if not key:
+            return None
+
+        start = np.searchsorted(self.keys, key, side='left')
+        end = np.searchsorted(self.keys, key, side='right')
+        rows = set(self.rows[start:end].tolist())
+
+        # Several places with the same coordinates (e.g. Wien/Vienna) are one place
+        places = {tuple(self.coordinates[row]): row for row in rows}
+        if len(places) != 1:
+            return None
+        return self._place(next(iter(places.values())))
+
+    def _place(self, row: int) -> Dict:
+        lat, lon = self.coordinates[row]
+        return {
+            'name': str(self.names[row]),
+            'postcode': str(self.postcodes[row]),
+            'state': str(self.states[row]),
+            'lat': float(lat),
+            'lon': float(lon)
+        }
+
+_gazetteer = None
+_gazetteer_lock = Lock()
+
+def get_gazetteer() -> Optional[Gazetteer]:
+    """Return the process-wide gazetteer, loading it on first use"""
+    global _gazetteer
+    if _gazetteer is None:
+        with _gazetteer_lock:
+            if _gazetteer is None:
+                try:
+                    _gazetteer = Gazetteer(Config.GAZETTEER_PATH)
+                except Exception as e:
+                    logger.error(f"Error loading gazetteer from {Config.GAZETTEER_PATH}: {str(e)}")
+                    return None
+    return _gazetteer
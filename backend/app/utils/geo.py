@@ -1,9 +1,13 @@
 import logging
-from typing import Dict, Optional, Tuple
+import unicodedata
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, Iterable, Optional, Tuple
+import numpy as np
+import shapely
 from geopy.geocoders import Nominatim
 from geopy.exc import GeocoderTimedOut, GeocoderServiceError
-from geopy.distance import geodesic
-from shapely.geometry import Point, Polygon
+from shapely.geometry import Point, shape
 from pyproj import Transformer
 from ..config import Config
 
@@ -12,6 +16,14 @@ logger = logging.getLogger(__name__)
 # Initialize geocoder with custom user agent
 geocoder = Nominatim(user_agent="infocal_app")
 
+# WGS84 ellipsoid parameters for the distance kernel
+WGS84_A_KM = 6378.137
+WGS84_F = 1 / 298.257223563
+
+# Web Mercator -> WGS84 transformer, created on first use and shared process-wide
+_mercator_transformer = None
+_transformer_lock = Lock()
+
 def validate_coordinates(lat: float, lon: float) -> bool:
     """Validate latitude and longitude values"""
     try:
@@ -30,17 +42,32 @@ def validate_coordinates(lat: float, lon: float) -> bool:
         logger.error(f"Error validating coordinates: {str(e)}")
         return False
 
-def geocode_location(location_name: str) -> Dict:
+class LocationNotFoundError(ValueError):
+    """Raised when the geocoder has no result for a location name"""
+
+def normalize_place_name(name: str) -> str:
+    """Case-fold a place name, strip diacritics and collapse whitespace"""
+    text = unicodedata.normalize('NFKD', name)
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(text.casefold().split())
+
+def normalize_location_query(location_name: str, language: str = 'en') -> str:
+    """Build a cache key for a location query, prefixed by the result language"""
+    return f"{language}:{normalize_place_name(location_name)}"
+
+def geocode_location(location_name: str, language: str = 'en') -> Dict:
     """
     Convert a location name to coordinates and structured data.
     
     Args:
         location_name (str): Name of the location to geocode
+        language (str): Language for the returned address (default: 'en')
         
     Returns:
         dict: Location data including coordinates and formatted address
         
     Raises:
+        LocationNotFoundError: If the geocoder has no result for the name
         ValueError: If location cannot be geocoded
     """
     try:
@@ -55,7 +82,7 @@ def geocode_location(location_name: str) -> Dict:
                 location = geocoder.geocode(
                     location_name,
                     exactly_one=True,
-                    language='en',
+                    language=language,
                     timeout=10
                 )
                 if location:
@@ -66,7 +93,7 @@ def geocode_location(location_name: str) -> Dict:
                 continue
         
         if location is None:
-            raise ValueError(f"Could not find coordinates for location: {location_name}")
+            raise LocationNotFoundError(f"Could not find coordinates for location: {location_name}")
             
         # Validate coordinates
         if not validate_coordinates(location.latitude, location.longitude):
@@ -87,6 +114,9 @@ def geocode_location(location_name: str) -> Dict:
         logger.info(f"Successfully geocoded location: {location_name}")
         return location_data
         
+    except LocationNotFoundError:
+        logger.info(f"No geocoding result for location: {location_name}")
+        raise
     except GeocoderTimedOut as e:
         logger.error(f"Geocoding timeout for {location_name}: {str(e)}")
         raise ValueError("Geocoding service timed out. Please try again.")
@@ -97,6 +127,156 @@ def geocode_location(location_name: str) -> Dict:
         logger.error(f"Unexpected error geocoding {location_name}: {str(e)}")
         raise ValueError(f"Unable to find location: {str(e)}")
 
+def get_mercator_transformer() -> Transformer:
+    """Return the process-wide Web Mercator (EPSG:3857) to WGS84 transformer"""
+    global _mercator_transformer
+    if _mercator_transformer is None:
+        with _transformer_lock:
+            if _mercator_transformer is None:
+                _mercator_transformer = Transformer.from_crs("EPSG:3857", "EPSG:4326", always_xy=True)
+    return _mercator_transformer
+
+def reproject_mercator(coords: np.ndarray) -> np.ndarray:
+    """Reproject an (N, 2) array of Web Mercator coordinates to WGS84 lon/lat in one call"""
+    lon, lat = get_mercator_transformer().transform(coords[:, 0], coords[:, 1])
+    return np.column_stack((lon, lat))
+
+def warning_polygon_from_geometry(geometry: Dict):
+    """
+    Build a WGS84 shapely geometry from a Geosphere (Multi)Polygon given in
+    Web Mercator (EPSG:3857) coordinates.
+
+    Args:
+        geometry (Dict): GeoJSON-style geometry with type and coordinates
+
+    Returns:
+        Polygon or MultiPolygon, or None if the geometry has no usable rings
+    """
+    mercator_geometry = shape(geometry)
+    if mercator_geometry.is_empty or mercator_geometry.geom_type not in ('Polygon', 'MultiPolygon'):
+        return None
+    # Reproject all vertices of all rings in a single vectorised call
+    return shapely.transform(mercator_geometry, reproject_mercator)
+
+class GeometryCache:
+    """
+    Prepared WGS84 warning geometries keyed by warning id.
+
+    Warning ids change with every Geosphere update (chgid/verlaufid), so a
+    cached geometry never goes stale; entries are evicted once the warning
+    expires, or least-recently-used first when the cache is full.
+    """
+
+    def __init__(self, max_entries: int = 2000):
+        self.max_entries = max_entries
+        self._geometries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, warning_id: Optional[str], geometry: Dict, buffer_km: float = 0.0):
+        """
+        Return the prepared geometry for a warning, building it on first use.
+
+        With buffer_km the geometry is grown by that distance (using the same
+        111 km per degree approximation as check_location_relevance).
+        """
+        if warning_id:
+            with self._lock:
+                variants = self._geometries.get(warning_id)
+                if variants is not None and buffer_km in variants:
+                    self._geometries.move_to_end(warning_id)
+                    return variants[buffer_km]
+
+        if buffer_km > 0:
+            polygon = self.get(warning_id, geometry)
+            if polygon is None:
+                return None
+            polygon = polygon.buffer(buffer_km / 111)
+        else:
+            polygon = warning_polygon_from_geometry(geometry)
+            if polygon is None:
+                return None
+        shapely.prepare(polygon)
+
+        if warning_id:
+            with self._lock:
+                self._geometries.setdefault(warning_id, {})[buffer_km] = polygon
+                self._geometries.move_to_end(warning_id)
+                while len(self._geometries) > self.max_entries:
+                    self._geometries.popitem(last=False)
+        return polygon
+
+    def evict(self, warning_ids: Iterable[str]):
+        """Drop the geometries of expired warnings"""
+        with self._lock:
+            for warning_id in warning_ids:
+                self._geometries.pop(warning_id, None)
+
+    def __len__(self):
+        return len(self._geometries)
+
+geometry_cache = GeometryCache(Config.GEOMETRY_CACHE_MAX_ENTRIES)
+
+def distance_matrix_km(user_lats, user_lons, warning_lats, warning_lons) -> np.ndarray:
+    """
+    Compute all pairwise distances between user and warning coordinates.
+
+    Args:
+        user_lats, user_lons: Sequences of user coordinates in degrees (length U)
+        warning_lats, warning_lons: Sequences of warning coordinates in degrees (length W)
+
+    Returns:
+        np.ndarray: (U, W) matrix of distances in kilometers
+    """
+    return distance_km(
+        np.asarray(user_lats, dtype=float)[:, np.newaxis],
+        np.asarray(user_lons, dtype=float)[:, np.newaxis],
+        np.asarray(warning_lats, dtype=float)[np.newaxis, :],
+        np.asarray(warning_lons, dtype=float)[np.newaxis, :]
+    )
+
+def distance_km(lats1, lons1, lats2, lons2) -> np.ndarray:
+    """
+    Compute element-wise distances in kilometers between two sets of
+    coordinates in degrees, broadcast against each other.
+
+    Uses Lambert's formula on the WGS84 ellipsoid, which stays within a few
+    metres of the geodesic distance at the ranges we care about while being
+    fully vectorised.
+    """
+    lat1 = np.radians(np.asarray(lats1, dtype=float))
+    lon1 = np.radians(np.asarray(lons1, dtype=float))
+    lat2 = np.radians(np.asarray(lats2, dtype=float))
+    lon2 = np.radians(np.asarray(lons2, dtype=float))
+
+    # Reduced latitudes on the ellipsoid
+    beta1 = np.arctan((1 - WGS84_F) * np.tan(lat1))
+    beta2 = np.arctan((1 - WGS84_F) * np.tan(lat2))
+
+    # Central angle between the reduced points (haversine form)
+    h = np.sin((beta2 - beta1) / 2) ** 2 + np.cos(beta1) * np.cos(beta2) * np.sin((lon2 - lon1) / 2) ** 2
+    sigma = 2 * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+
+    p = (beta1 + beta2) / 2
+    q = (beta2 - beta1) / 2
+    sin_sigma = np.sin(sigma)
+    cos_half = np.cos(sigma / 2) ** 2
+    sin_half = np.sin(sigma / 2) ** 2
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x = (sigma - sin_sigma) * np.sin(p) ** 2 * np.cos(q) ** 2 / cos_half
+        y = (sigma + sin_sigma) * np.cos(p) ** 2 * np.sin(q) ** 2 / sin_half
+        correction = np.where(sigma > 0, x + y, 0.0)
+
+    return WGS84_A_KM * (sigma - WGS84_F / 2 * correction)
+
+def relevance_mask(user_lats, user_lons, warning_lats, warning_lons, radius_km: float = None) -> np.ndarray:
+    """
+    Return a (U, W) boolean matrix that is True where a warning coordinate
+    lies within radius_km (default Config.WARNING_RADIUS_KM) of a user.
+    """
+    radius_km = Config.WARNING_RADIUS_KM if radius_km is None else radius_km
+    return distance_matrix_km(user_lats, user_lons, warning_lats, warning_lons) <= radius_km
+
 def check_location_relevance(user_location: Dict, warning_location: Dict) -> bool:
     """
     Check if a warning location is relevant for a user location based on both
@@ -110,9 +290,9 @@ def check_location_relevance(user_location: Dict, warning_location: Dict) -> boo
         bool: True if warning is relevant
     """
     try:
-        # Log input values
-        logger.debug(f"Checking relevance - User location: {user_location}")
-        logger.debug(f"Checking relevance - Warning location: {warning_location}")
+        # Log input values (without the warning geometry, which is expensive to format)
+        logger.debug(f"Checking relevance - User location: {user_location.get('name')}")
+        logger.debug(f"Checking relevance - Warning: {warning_location.get('warning_id')}")
 
         # Extract user coordinates
         user_lat = float(user_location.get('lat', 0))
@@ -128,18 +308,9 @@ def check_location_relevance(user_location: Dict, warning_location: Dict) -> boo
             try:
                 # Create point from user location
                 user_point = Point(user_lon, user_lat)
+                warning_polygon = geometry_cache.get(warning_location.get('warning_id'), geometry)
                 
-                # Get the first polygon from the MultiPolygon
-                polygon_coords = []
-                transformer = Transformer.from_crs("EPSG:3857", "EPSG:4326", always_xy=True)
-                
-                for coord in geometry['coordinates'][0][0]:
-                    # Convert Web Mercator coordinates to WGS84 (lat/lon)
-                    lon, lat = transformer.transform(coord[0], coord[1])
-                    polygon_coords.append((lon, lat))
-                
-                if polygon_coords:
-                    warning_polygon = Polygon(polygon_coords)
+                if warning_polygon is not None:
                     # Check if point is within polygon or within the radius of the polygon
                     is_within = warning_polygon.contains(user_point)
                     if is_within:
@@ -147,7 +318,7 @@ def check_location_relevance(user_location: Dict, warning_location: Dict) -> boo
                         return True
                     
                     # If not within polygon, check distance to polygon
-                    distance_to_polygon = warning_polygon.exterior.distance(user_point) * 111  # Convert to km
+                    distance_to_polygon = warning_polygon.distance(user_point) * 111  # Convert to km
                     is_near = distance_to_polygon <= Config.WARNING_RADIUS_KM
                     logger.debug(f"Distance to polygon: {distance_to_polygon:.2f}km, is near: {is_near}")
                     return is_near
@@ -169,11 +340,13 @@ def check_location_relevance(user_location: Dict, warning_location: Dict) -> boo
             logger.error(f"Warning: ({warn_lat}, {warn_lon})")
             return False
 
-        # Calculate distance
-        user_coords = (user_lat, user_lon)
-        warn_coords = (warn_lat, warn_lon)
-        
-        distance = geodesic(user_coords, warn_coords).kilometers
+        # Calculate distance with the vectorised kernel (a 1x1 matrix here)
+        distance = float(distance_matrix_km(
+            user_lats=[user_lat],
+            user_lons=[user_lon],
+            warning_lats=[warn_lat],
+            warning_lons=[warn_lon]
+        )[0, 0])
         is_relevant = distance <= Config.WARNING_RADIUS_KM
         
         logger.debug(
@@ -188,6 +361,60 @@ def check_location_relevance(user_location: Dict, warning_location: Dict) -> boo
         logger.error(f"Error checking location relevance: {str(e)}", exc_info=True)
         return False
 
+def snap_to_grid(lat: float, lon: float, grid_degrees: float) -> Tuple[float, float]:
+    """Snap coordinates to the centre of their grid cell"""
+    lat = float(lat)
+    lon = float(lon)
+    if grid_degrees <= 0:
+        return lat, lon
+    return (
+        round(round(lat / grid_degrees) * grid_degrees, 6),
+        round(round(lon / grid_degrees) * grid_degrees, 6)
+    )
+
+def plan_location_cells(locations: Iterable[Dict], grid_degrees: float) -> Tuple[Dict, Dict]:
+    """
+    Collapse identical and nearby locations into grid cells so that each
+    cell only has to be queried once.
+
+    Args:
+        locations (Iterable[Dict]): Locations with lat/lon coordinates, read once
+        grid_degrees (float): Cell size in degrees (0 disables snapping)
+
+    Returns:
+        tuple: Mapping of cell key to cell data (query coordinates and the
+        distinct original coordinates it covers) and the planning stats
+    """
+    cells = {}
+    total = 0
+    skipped = 0
+
+    for location in locations:
+        lat = location.get('lat')
+        lon = location.get('lon')
+        if lat is None or lon is None or not validate_coordinates(lat, lon):
+            logger.error(f"Missing or invalid coordinates for location: {location}")
+            skipped += 1
+            continue
+
+        total += 1
+        key = snap_to_grid(lat, lon, grid_degrees)
+        cell = cells.get(key)
+        if cell is None:
+            cell = cells[key] = {'lat': key[0], 'lon': key[1], 'locations': set()}
+        cell['locations'].add((float(lat), float(lon)))
+
+    distinct = sum(len(cell['locations']) for cell in cells.values())
+    stats = {
+        'locations': total,
+        'skipped': skipped,
+        'distinct_locations': distinct,
+        'cells': len(cells),
+        'cell_hits': total - len(cells),
+        'collapse_ratio': round(1 - len(cells) / total, 4) if total else 0.0
+    }
+    return cells, stats
+
 def get_bounding_box(lat: float, lon: float, radius_km: float) -> Dict:
     """Calculate a bounding box around a point"""
     try:
@@ -0,0 +1,110 @@
+import logging
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+class CacheEntry:
+    def __init__(self, value: Any, etag: Optional[str] = None, last_modified: Optional[str] = None):
+        self.value = value
+        self.etag = etag
+        self.last_modified = last_modified
+        self.stored_at = time.monotonic()
+
+class ResponseCache:
+    """
+    Size-bounded LRU cache of parsed HTTP responses and their validators.
+
+    Entries are keyed by URL and query parameters and keep the ETag and
+    Last-Modified headers of the response, so that later requests can be
+    made conditional and a 304 can reuse the already-parsed value. Cached
+    values are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, ttl: int = 3600, max_entries: int = 5000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        self._counters = {
+            'hits': 0,
+            'misses': 0,
+            'stores': 0,
+            'evictions': 0,
+            'expirations': 0
+        }
+
+    @staticmethod
+    def make_key(url: str, params: Optional[Dict[str, Any]] = None) -> str:
+        """Build a cache key from the URL and sorted query parameters"""
+        if not params:
+            return url
+        query = '&'.join(f"{key}={params[key]}" for key in sorted(params))
+        return f"{url}?{query}"
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """Return the entry for key if it exists and has not expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self.ttl > 0 and time.monotonic() - entry.stored_at > self.ttl:
+                del self._entries[key]
+                self._counters['expirations'] += 1
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    @staticmethod
+    def conditional_headers(entry: Optional[CacheEntry]) -> Dict[str, str]:
+        """Build If-None-Match/If-Modified-Since headers for a cached entry"""
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers['If-None-Match'] = entry.etag
+            if entry.last_modified:
+                headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    def store(self, key: str, value: Any, etag: Optional[str] = None, last_modified: Optional[str] = None):
+        """Store a parsed response; responses without validators cannot be revalidated and are skipped"""
+        if not etag and not last_modified:
+            return
+
+        with self._lock:
+            self._entries[key] = CacheEntry(value, etag, last_modified)
+            self._entries.move_to_end(key)
+            self._counters['stores'] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters['evictions'] += 1
+
+    def record_hit(self, key: str):
+        """Record a 304 revalidation and refresh the entry's age"""
+        with self._lock:
+            self._counters['hits'] += 1
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.stored_at = time.monotonic()
+
+    def record_miss(self):
+        with self._lock:
+            self._counters['misses'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return cache counters for metrics scraping"""
+        with self._lock:
+            lookups = self._counters['hits'] + self._counters['misses']
+            return dict(
+                self._counters,
+                size=len(self._entries),
+                max_entries=self.max_entries,
+                ttl=self.ttl,
+                hit_ratio=round(self._counters['hits'] / lookups, 4) if lookups else 0.0
+            )
@@ -0,0 +1,8 @@
+# Loaded by gunicorn from the working directory.
+# The app is preloaded in the master (see the Dockerfile's --preload) so the
+# gazetteer is shared between workers; background threads are started in
+# each worker after the fork instead.
+
+def post_fork(server, worker):
+    import wsgi
+    wsgi.start_background_workers()
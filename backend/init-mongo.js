@@ -12,8 +12,28 @@ db.createUser({
   db.createCollection("users");
   db.createCollection("warnings");
   db.createCollection("warning_history");
+  db.createCollection("geocode_cache");
+  db.createCollection("location_subscriptions");
+  db.createCollection("warning_history_archive");
+  db.createCollection("leases");
+  db.createCollection("processing_cycles");
+  db.createCollection("shard_checkpoints");
   
   // Create indexes
   db.users.createIndex({ "email": 1 }, { unique: true });
   db.warnings.createIndex({ "warning_id": 1 }, { unique: true });
+  db.warnings.createIndex({ "warnid": 1 });
+  db.warnings.createIndex({ "start_time": 1 });
+  db.warnings.createIndex({ "end_time": 1 });
+  db.warnings.createIndex({ "cells": 1, "end_time": 1 });
+  db.warnings.createIndex({ "expires_at": 1 }, { expireAfterSeconds: 0 });
   db.warning_history.createIndex({ "user_email": 1, "warning_id": 1 }, { unique: true });
+  db.warning_history.createIndex({ "user_email": 1, "processed_at": -1, "_id": -1 });
+  db.warning_history_archive.createIndex({ "user_email": 1, "month": 1 }, { unique: true });
+  db.geocode_cache.createIndex({ "key": 1 }, { unique: true });
+  db.geocode_cache.createIndex({ "expires_at": 1 }, { expireAfterSeconds: 0 });
+  db.location_subscriptions.createIndex({ "updated_at": 1 });
+  db.location_subscriptions.createIndex({ "subscribers.email": 1, "subscribers.name": 1 });
+  db.processing_cycles.createIndex({ "created_at": 1 }, { expireAfterSeconds: 6 * 3600 });
+  db.shard_checkpoints.createIndex({ "shard": 1, "cycle_id": 1 });
+  db.shard_checkpoints.createIndex({ "updated_at": 1 }, { expireAfterSeconds: 6 * 3600 });
@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+from geopy.distance import geodesic
+from app.config import Config
+from app.utils.geo import check_location_relevance, distance_matrix_km, relevance_mask
+
+VIENNA = (48.2082, 16.3738)
+
+# Pairs at the ranges warnings are matched over: within Austria and its neighbours
+AUSTRIAN_PAIRS = [
+    (VIENNA, (47.2692, 11.4041)),  # Vienna - Innsbruck
+    ((47.0707, 15.4395), (47.8095, 13.0550)),  # Graz - Salzburg
+    ((47.5031, 9.7471), (48.2082, 16.3738)),  # Bregenz - Vienna
+    ((46.6247, 14.3053), (48.3069, 14.2858)),  # Klagenfurt - Linz
+    (VIENNA, (48.2090, 16.3740)),  # ~90 m apart
+]
+
+# Lambert's formula agrees with the geodesic to well under a metre at these ranges
+AUSTRIAN_TOLERANCE_KM = 0.001
+
+# Near-antipodal points are the formula's worst case: the geodesic runs over
+# the pole while the kernel follows the equator, up to ~0.17% too long
+ANTIPODAL_PAIRS = [
+    ((0.0, 0.0), (0.0, 180.0)),
+    ((10.0, 20.0), (-10.0, -160.0)),
+    (VIENNA, (-VIENNA[0], VIENNA[1] - 180.0)),
+    ((60.0, 10.0), (-60.0, -170.0)),
+    ((30.0, 0.0), (-29.5, 179.5)),
+    ((89.9, 0.0), (-89.9, 180.0)),
+]
+ANTIPODAL_RELATIVE_TOLERANCE = 0.002
+
+def _distance(a, b):
+    return distance_matrix_km([a[0]], [a[1]], [b[0]], [b[1]])[0, 0]
+
+@pytest.mark.parametrize('a, b', AUSTRIAN_PAIRS)
+def test_distance_matches_geodesic_at_austrian_scale(a, b):
+    assert _distance(a, b) == pytest.approx(geodesic(a, b).km, abs=AUSTRIAN_TOLERANCE_KM)
+
+@pytest.mark.parametrize('a, b', ANTIPODAL_PAIRS)
+def test_distance_matches_geodesic_near_antipodes(a, b):
+    assert _distance(a, b) == pytest.approx(geodesic(a, b).km, rel=ANTIPODAL_RELATIVE_TOLERANCE)
+
+def test_distance_matrix_shape_and_symmetry():
+    lats = [p[0] for p, _ in AUSTRIAN_PAIRS]
+    lons = [p[1] for p, _ in AUSTRIAN_PAIRS]
+    other_lats = [q[0] for _, q in AUSTRIAN_PAIRS[:3]]
+    other_lons = [q[1] for _, q in AUSTRIAN_PAIRS[:3]]
+
+    forward = distance_matrix_km(lats, lons, other_lats, other_lons)
+    backward = distance_matrix_km(other_lats, other_lons, lats, lons)
+
+    assert forward.shape == (len(AUSTRIAN_PAIRS), 3)
+    np.testing.assert_allclose(forward, backward.T, atol=1e-9)
+    assert _distance(VIENNA, VIENNA) == 0.0
+
+def _points_at(origin, distances_km, bearing=45.0):
+    points = [geodesic(kilometers=d).destination(origin, bearing) for d in distances_km]
+    return [p.latitude for p in points], [p.longitude for p in points]
+
+@pytest.mark.parametrize('bearing', [0.0, 90.0, 225.0])
+def test_relevance_mask_at_warning_radius(bearing):
+    radius = Config.WARNING_RADIUS_KM
+    # 50 m either side of the radius, far beyond the kernel's error
+    lats, lons = _points_at(VIENNA, [radius - 0.05, radius + 0.05], bearing)
+
+    mask = relevance_mask([VIENNA[0]], [VIENNA[1]], lats, lons)
+
+    assert mask.tolist() == [[True, False]]
+
+def test_relevance_mask_includes_exact_radius():
+    lats, lons = _points_at(VIENNA, [20.0])
+    distance = distance_matrix_km([VIENNA[0]], [VIENNA[1]], lats, lons)[0, 0]
+
+    assert relevance_mask([VIENNA[0]], [VIENNA[1]], lats, lons, radius_km=distance).tolist() == [[True]]
+    assert relevance_mask([VIENNA[0]], [VIENNA[1]], lats, lons, radius_km=distance - 1e-6).tolist() == [[False]]
+
+def test_relevance_mask_reads_configured_radius(monkeypatch):
+    lats, lons = _points_at(VIENNA, [30.0])
+    monkeypatch.setattr(Config, 'WARNING_RADIUS_KM', 25.0)
+    assert relevance_mask([VIENNA[0]], [VIENNA[1]], lats, lons).tolist() == [[False]]
+    monkeypatch.setattr(Config, 'WARNING_RADIUS_KM', 35.0)
+    assert relevance_mask([VIENNA[0]], [VIENNA[1]], lats, lons).tolist() == [[True]]
+
+def test_distance_matrix_of_empty_sides_is_empty():
+    assert distance_matrix_km([], [], [VIENNA[0]], [VIENNA[1]]).shape == (0, 1)
+    assert distance_matrix_km([VIENNA[0]], [VIENNA[1]], [], []).shape == (1, 0)
+    assert relevance_mask([], [], [], []).shape == (0, 0)
+
+def test_check_location_relevance_by_distance():
+    lats, lons = _points_at(VIENNA, [Config.WARNING_RADIUS_KM - 1, Config.WARNING_RADIUS_KM + 1])
+    user = {'name': 'Wien', 'lat': VIENNA[0], 'lon': VIENNA[1]}
+
+    assert check_location_relevance(user, {'lat': lats[0], 'lon': lons[0]})
+    assert not check_location_relevance(user, {'lat': lats[1], 'lon': lons[1]})
@@ -0,0 +1,91 @@
+import pytest
+from app.models.warning import Warning
+from app.services.history_writer import HistoryWriter
+
+class FakeHistory:
+    """Stands in for the history collection behind Warning's bulk helpers"""
+
+    def __init__(self):
+        self.stored = {}  # (user_email, warning_id) -> calendar_event_id
+        self.failing = set()  # warning ids whose inserts are rejected
+        self.writes = 0
+
+    def mark_processed_many(self, records):
+        self.writes += 1
+        duplicates, failed = [], []
+        for record in records:
+            key = (record['user_email'], record['warning_id'])
+            if record['warning_id'] in self.failing:
+                failed.append(record)
+            elif key in self.stored:
+                duplicates.append(record)
+            else:
+                self.stored[key] = record['calendar_event_id']
+        return duplicates, failed
+
+    def find_history(self, user_email, warning_ids):
+        return [
+            {'warning_id': warning_id, 'calendar_event_id': self.stored[(user_email, warning_id)]}
+            for warning_id in warning_ids if (user_email, warning_id) in self.stored
+        ]
+
+@pytest.fixture
+def history(monkeypatch):
+    fake = FakeHistory()
+    monkeypatch.setattr(Warning, 'mark_processed_many', fake.mark_processed_many)
+    monkeypatch.setattr(Warning, 'find_history', fake.find_history)
+    return fake
+
+def test_duplicate_with_own_event_is_ignored(history):
+    history.stored[('a@x', 'w1')] = 'e1'
+    conflicts = []
+    writer = HistoryWriter(on_duplicate=conflicts.append)
+
+    writer.add('a@x', 'w1', 'e1')
+    writer.flush()
+
+    assert conflicts == []
+    assert writer.get_stats()['duplicates'] == 1
+    assert writer.get_stats()['conflicts'] == 0
+
+def test_duplicate_with_other_event_calls_on_duplicate(history):
+    history.stored[('a@x', 'w1')] = 'e1'
+    conflicts = []
+    writer = HistoryWriter(on_duplicate=conflicts.append)
+
+    writer.add('a@x', 'w1', 'e2')
+    writer.flush()
+
+    assert [record['calendar_event_id'] for record in conflicts] == ['e2']
+    assert writer.get_stats()['conflicts'] == 1
+
+def test_failed_record_is_dropped_after_max_attempts(history):
+    history.failing.add('bad')
+    writer = HistoryWriter()
+    writer.max_attempts = 3
+
+    writer.add('a@x', 'bad', 'e1')
+    writer.add('a@x', 'good', 'e2')
+    for _ in range(5):
+        writer.flush()
+
+    assert history.writes == 3
+    assert history.stored == {('a@x', 'good'): 'e2'}
+    stats = writer.get_stats()
+    assert (stats['written'], stats['dropped'], stats['pending']) == (1, 1, 0)
+    assert writer.failures == {}
+
+def test_failed_flush_requeues_without_counting(history, monkeypatch):
+    writer = HistoryWriter()
+    writer.max_attempts = 1
+    writer.add('a@x', 'w1', 'e1')
+
+    def unreachable(records):
+        raise ConnectionError('mongo down')
+    monkeypatch.setattr(Warning, 'mark_processed_many', unreachable)
+    writer.flush()
+    monkeypatch.setattr(Warning, 'mark_processed_many', history.mark_processed_many)
+    writer.flush()
+
+    assert history.stored == {('a@x', 'w1'): 'e1'}
+    assert writer.get_stats()['dropped'] == 0
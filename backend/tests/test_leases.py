@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta
+import pytest
+import app.models.db as db_module
+from app.models.lease import Lease
+from app.models.processing_cycle import ProcessingCycle
+
+mongomock = pytest.importorskip('mongomock')
+
+@pytest.fixture(autouse=True)
+def db(monkeypatch):
+    database = mongomock.MongoClient().db
+    monkeypatch.setattr(db_module, 'get_db', lambda: database)
+    return database
+
+def _expire(db, name):
+    db.leases.update_one({'_id': name}, {'$set': {'expires_at': datetime.utcnow() - timedelta(seconds=1)}})
+
+def test_live_lease_is_not_taken_over():
+    assert Lease.acquire('leader', 'a', ttl=30) == 1
+
+    assert Lease.acquire('leader', 'b', ttl=30) is None
+    assert Lease.get('leader')['holder'] == 'a'
+
+def test_holder_renews_with_its_token():
+    token = Lease.acquire('leader', 'a', ttl=30)
+
+    assert Lease.acquire('leader', 'a', ttl=30, token=token) == token
+
+def test_expired_lease_is_taken_over_with_new_token(db):
+    old_token = Lease.acquire('leader', 'a', ttl=30)
+    _expire(db, 'leader')
+
+    new_token = Lease.acquire('leader', 'b', ttl=30)
+
+    assert new_token == old_token + 1
+    assert Lease.get('leader')['holder'] == 'b'
+    assert not Lease.is_current('leader', old_token)
+    # The stalled holder cannot renew with its fenced-off token
+    assert Lease.acquire('leader', 'a', ttl=30, token=old_token) is None
+
+def test_advance_rejects_stale_token():
+    assert ProcessingCycle.advance('c1', 0, token=2, last_email='m@x')
+
+    assert not ProcessingCycle.advance('c1', 0, token=1, last_email='z@x', done=True)
+    checkpoint = ProcessingCycle.get_checkpoint('c1', 0)
+    assert (checkpoint['token'], checkpoint['last_email'], checkpoint['done']) == (2, 'm@x', False)
+
+def test_advance_keeps_position_for_new_owner():
+    ProcessingCycle.advance('c1', 0, token=1, last_email='m@x')
+
+    assert ProcessingCycle.advance('c1', 0, token=2)
+    checkpoint = ProcessingCycle.get_checkpoint('c1', 0)
+    assert (checkpoint['token'], checkpoint['last_email']) == (2, 'm@x')
@@ -0,0 +1,58 @@
+from types import SimpleNamespace
+from geopy.distance import geodesic
+from app.services.matching_service import WarningMatcher
+
+INNSBRUCK = (47.2692, 11.4041)
+
+def _warning(warning_id, *coords):
+    return {
+        'warning_id': warning_id,
+        'location': {'lat': coords[0][0], 'lon': coords[0][1]},
+        'locations': [{'lat': lat, 'lon': lon} for lat, lon in coords],
+        'raw_data': {}
+    }
+
+def _user(email, *coords):
+    return SimpleNamespace(email=email, locations=[{'lat': lat, 'lon': lon} for lat, lon in coords])
+
+def _offset(origin, km, bearing=90.0):
+    point = geodesic(kilometers=km).destination(origin, bearing)
+    return point.latitude, point.longitude
+
+def test_point_warning_matches_fetched_coordinate():
+    matcher = WarningMatcher([_warning('w1c1v1', INNSBRUCK)], point_tolerance_km=1.0)
+
+    assert [w['warning_id'] for w in matcher.match([_user('a@x', INNSBRUCK)])['a@x']] == ['w1c1v1']
+
+def test_point_warning_matches_drifted_coordinates():
+    matcher = WarningMatcher([_warning('w1c1v1', INNSBRUCK)], point_tolerance_km=1.0)
+    users = [
+        _user('rounded@x', (round(INNSBRUCK[0], 3), round(INNSBRUCK[1], 3))),
+        _user('east@x', _offset(INNSBRUCK, 0.9, 90.0)),
+        _user('north@x', _offset(INNSBRUCK, 0.9, 0.0)),
+        _user('far@x', _offset(INNSBRUCK, 1.1, 90.0)),
+    ]
+
+    matches = matcher.match(users)
+
+    assert sorted(matches) == ['east@x', 'north@x', 'rounded@x']
+
+def test_point_warning_listed_once_per_user():
+    warning = _warning('w1c1v1', INNSBRUCK, _offset(INNSBRUCK, 0.2))
+    matcher = WarningMatcher([warning], point_tolerance_km=1.0)
+
+    matches = matcher.match([_user('a@x', INNSBRUCK, _offset(INNSBRUCK, 0.1))])
+
+    assert [w['warning_id'] for w in matches['a@x']] == ['w1c1v1']
+
+def test_point_tolerance_zero_is_exact():
+    matcher = WarningMatcher([_warning('w1c1v1', INNSBRUCK)], point_tolerance_km=0.0)
+
+    matches = matcher.match([_user('a@x', INNSBRUCK), _user('b@x', _offset(INNSBRUCK, 0.01))])
+
+    assert sorted(matches) == ['a@x']
+
+def test_users_without_coordinates_match_nothing():
+    matcher = WarningMatcher([_warning('w1c1v1', INNSBRUCK)])
+
+    assert matcher.match([SimpleNamespace(email='a@x', locations=[{'name': 'Nowhere'}])]) == {}
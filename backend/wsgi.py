@@ -1,15 +1,40 @@
 import logging
-from app.main import app
+from app.main import app, geocoding_service
 from app.services.warning_service import WarningService
+from app.utils.gazetteer import get_gazetteer
+from app.models.warning import Warning
+from app.models.processing_cycle import ProcessingCycle
 
 # Setup logging
 logger = logging.getLogger(__name__)
 
-# Initialize warning service
-warning_service = WarningService()
-warning_service.start_warning_processor()
+# Load the gazetteer up front; gunicorn runs with --preload, so its arrays
+# are loaded once in the master and shared copy-on-write by all workers
+get_gazetteer()
 
-logger.info("Warning processor initialized in WSGI")
+def start_background_workers():
+    """
+    Build indexes, then start the warning processor and the geocoding worker.
+
+    Threads do not survive a fork, so under gunicorn this is called from the
+    post_fork hook in gunicorn.conf.py, once in every worker, never in the
+    preloading master. The indexes are built here too: a Mongo client in the
+    master would leave its monitor threads running across the fork.
+    """
+    try:
+        Warning.ensure_indexes()
+        ProcessingCycle.ensure_indexes()
+    except Exception as e:
+        logger.error(f"Error ensuring warning indexes: {str(e)}")
+
+    warning_service = WarningService()
+    warning_service.start_warning_processor()
+
+    # Start background geocoding of queued locations
+    geocoding_service.start_worker()
+
+    logger.info("Warning processor initialized in WSGI")
 
 if __name__ == "__main__":
+    start_background_workers()
     app.run()
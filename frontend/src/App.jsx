@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useCallback } from 'react';
 import { Card } from '@/components/ui/card';
 import { Alert, AlertDescription } from '@/components/ui/alert';
 import LocationPanel from './components/LocationPanel';
@@ -79,6 +79,15 @@ export default function App() {
     }
   };
 
+  const handleRefreshLocations = useCallback(async () => {
+    try {
+      const response = await api.getLocations();
+      setLocations(response.locations || []);
+    } catch (err) {
+      console.error('Failed to refresh locations:', err);
+    }
+  }, []);
+
   const handleRemoveLocation = async (location) => {
     try {
       setError(null);
@@ -148,6 +157,7 @@ export default function App() {
             locations={locations}
             onAddLocation={handleAddLocation}
             onRemoveLocation={handleRemoveLocation}
+            onRefreshLocations={handleRefreshLocations}
           />
           <CalendarPanel warnings={warnings} />
           <WarningPanel
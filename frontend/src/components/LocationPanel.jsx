@@ -5,6 +5,7 @@ import { Input } from '@/components/ui/input';
 import { Alert, AlertDescription } from '@/components/ui/alert';
 import { Map, X } from 'lucide-react';
 import { MapContainer, TileLayer, Marker, Popup, useMap } from 'react-leaflet';
+import api from '@/services/api';
 
 // Helper component to update map view
 function MapUpdater({ center, zoom }) {
@@ -17,12 +18,16 @@ function MapUpdater({ center, zoom }) {
   return null;
 }
 
-export default function LocationPanel({ locations = [], onAddLocation, onRemoveLocation }) {
+const PENDING_POLL_INTERVAL = 2000;
+const SUGGEST_DEBOUNCE = 150;
+
+export default function LocationPanel({ locations = [], onAddLocation, onRemoveLocation, onRefreshLocations }) {
   const [newLocation, setNewLocation] = useState('');
   const [error, setError] = useState(null);
   const [isAdding, setIsAdding] = useState(false);
   const [mapCenter, setMapCenter] = useState([48.2082, 16.3738]); // Vienna default
   const [mapZoom, setMapZoom] = useState(12);
+  const [suggestions, setSuggestions] = useState([]);
 
   // Update map center when locations change
   useEffect(() => {
@@ -34,6 +39,35 @@ export default function LocationPanel({ locations = [], onAddLocation, onRemoveL
     }
   }, [locations]);
 
+  // Poll while any location is still being geocoded in the background
+  useEffect(() => {
+    if (!onRefreshLocations || !locations.some(loc => loc.status === 'pending')) return;
+    const timer = setTimeout(onRefreshLocations, PENDING_POLL_INTERVAL);
+    return () => clearTimeout(timer);
+  }, [locations, onRefreshLocations]);
+
+  // Autocomplete from the offline gazetteer
+  useEffect(() => {
+    const query = newLocation.trim();
+    if (query.length < 2) {
+      setSuggestions([]);
+      return;
+    }
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      try {
+        const response = await api.suggestLocations(query);
+        if (!cancelled) setSuggestions(response.suggestions || []);
+      } catch (err) {
+        if (!cancelled) setSuggestions([]);
+      }
+    }, SUGGEST_DEBOUNCE);
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [newLocation]);
+
   const handleSubmit = async (e) => {
     e.preventDefault();
     if (!newLocation.trim()) return;
@@ -89,7 +123,16 @@ export default function LocationPanel({ locations = [], onAddLocation, onRemoveL
             placeholder="Add new location..."
             disabled={isAdding}
             className="flex-1"
+            list="location-suggestions"
+            autoComplete="off"
           />
+          <datalist id="location-suggestions">
+            {suggestions.map((place) => (
+              <option key={`${place.name}-${place.postcode}`} value={place.name}>
+                {`${place.postcode} ${place.name}, ${place.state}`}
+              </option>
+            ))}
+          </datalist>
           <Button type="submit" disabled={isAdding}>
             {isAdding ? (
               <div className="animate-spin rounded-full h-4 w-4 border-b-2 border-white"></div>
@@ -142,6 +185,12 @@ export default function LocationPanel({ locations = [], onAddLocation, onRemoveL
                     {location.address && (
                       <div className="text-sm text-gray-500 truncate">{location.address}</div>
                     )}
+                    {location.status === 'pending' && (
+                      <div className="text-sm text-gray-500 truncate">Looking up location...</div>
+                    )}
+                    {location.status === 'failed' && (
+                      <div className="text-sm text-red-500 truncate">{location.error || 'Location not found'}</div>
+                    )}
                   </div>
                   <Button
                     variant="ghost"
@@ -68,6 +68,11 @@ class ApiService {
     });
   }
 
+  async suggestLocations(query, limit = 10) {
+    const params = new URLSearchParams({ q: query, limit });
+    return this.request(`/locations/suggest?${params}`);
+  }
+
   async removeLocation(location) {
     return this.request('/locations', {
       method: 'DELETE',